@@ -0,0 +1,197 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from recipes.models import Ingredient, Tag
+
+
+class ReferenceCache:
+    """LRU-кеш справочных данных в памяти процесса.
+
+    Записи помечаются версией справочника. Версия увеличивается
+    сигналами после коммита изменений моделей и, если задан
+    REFERENCE_CACHE_ALIAS, хранится в общем кеше Django, чтобы
+    изменения видели все процессы. Без общего кеша устаревшие
+    записи в других процессах живут не дольше REFERENCE_CACHE_TIMEOUT.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.version_key = f"reference:{name}:version"
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._local_version = 0
+
+    @staticmethod
+    def shared_cache():
+        alias = settings.REFERENCE_CACHE_ALIAS
+        return caches[alias] if alias else None
+
+    def version(self):
+        shared = self.shared_cache()
+        if shared is None:
+            return self._local_version
+        return (self._local_version, shared.get_or_set(self.version_key, 0))
+
+    def bump(self):
+        with self._lock:
+            self._local_version += 1
+            self._entries.clear()
+        shared = self.shared_cache()
+        if shared is not None:
+            try:
+                shared.incr(self.version_key)
+            except ValueError:
+                shared.set(self.version_key, 1, timeout=None)
+
+    def _lookup(self, key, version, now):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] != version or entry[1] < now:
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _store(self, key, version, now, value):
+        self._entries[key] = (
+            version, now + settings.REFERENCE_CACHE_TIMEOUT, value
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > settings.REFERENCE_CACHE_MAXSIZE:
+            self._entries.popitem(last=False)
+
+    def get(self, key, loader):
+        version, now = self.version(), time.monotonic()
+        with self._lock:
+            entry = self._lookup(key, version, now)
+        if entry is not None:
+            return entry[2]
+        value = loader()
+        with self._lock:
+            self._store(key, version, now, value)
+        return value
+
+    def get_many(self, keys, loader):
+        """Значения по ключам; промахи загружаются одним вызовом loader.
+
+        loader получает список ключей и возвращает словарь,
+        ключи, которых в нём нет, в результат не попадают.
+        """
+        version, now = self.version(), time.monotonic()
+        found, missing = {}, []
+        with self._lock:
+            for key in dict.fromkeys(keys):
+                entry = self._lookup(key, version, now)
+                if entry is None:
+                    missing.append(key)
+                else:
+                    found[key] = entry[2]
+        if missing:
+            loaded = loader(missing)
+            with self._lock:
+                for key, value in loaded.items():
+                    self._store(key, version, now, value)
+            found.update(loaded)
+        return found
+
+
+tags_cache = ReferenceCache("tags")
+ingredients_cache = ReferenceCache("ingredients")
+
+
+def get_tags():
+    """Все теги {id: Tag} в порядке модели."""
+    return tags_cache.get(
+        "all", lambda: {tag.id: tag for tag in Tag.objects.all()}
+    )
+
+
+def get_ingredients(ids):
+    """Ингредиенты {id: Ingredient} для переданных id."""
+    return ingredients_cache.get_many(ids, Ingredient.objects.in_bulk)
+
+
+def get_tags_by_ids(ids):
+    tags = get_tags()
+    return {pk: tags[pk] for pk in ids if pk in tags}
+
+
+def get_tag_ids_by_slugs(slugs):
+    """id тегов по slug без запроса к базе."""
+    mapping = tags_cache.get("slugs", lambda: {
+        tag.slug: tag.id for tag in get_tags().values()
+    })
+    return [mapping[slug] for slug in slugs if slug in mapping]
+
+
+class SubscriptionsCache:
+    """Кеш ответов /users/subscriptions/ в кеше Django.
+
+    Ключ ответа содержит версию подписок пользователя, а вместе
+    с ответом хранятся версии авторов на странице: подписка или
+    отписка меняет версию пользователя, публикация рецепта —
+    версию автора, и устаревший ответ не отдаётся.
+    """
+
+    prefix = "subscriptions"
+
+    def __init__(self):
+        self.cache = caches["default"]
+
+    @property
+    def timeout(self):
+        return settings.SUBSCRIPTIONS_CACHE_TIMEOUT
+
+    def user_key(self, user_id):
+        return f"{self.prefix}:user:{user_id}"
+
+    def author_key(self, author_id):
+        return f"{self.prefix}:author:{author_id}"
+
+    def response_key(self, user_id, path):
+        version = self.cache.get(self.user_key(user_id), 0)
+        return f"{self.prefix}:{user_id}:{version}:{path}"
+
+    def author_versions(self, author_ids):
+        keys = {self.author_key(author_id): author_id
+                for author_id in author_ids}
+        stored = self.cache.get_many(keys)
+        return {author_id: stored.get(key, 0)
+                for key, author_id in keys.items()}
+
+    def get(self, user_id, path):
+        if not self.timeout:
+            return None
+        entry = self.cache.get(self.response_key(user_id, path))
+        if entry is None:
+            return None
+        versions, data = entry
+        if self.author_versions(versions) != versions:
+            return None
+        return data
+
+    def set(self, user_id, path, author_ids, data):
+        if not self.timeout:
+            return
+        self.cache.set(
+            self.response_key(user_id, path),
+            (self.author_versions(author_ids), data),
+            self.timeout,
+        )
+
+    def _bump(self, key):
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            self.cache.set(key, 1, timeout=None)
+
+    def invalidate_user(self, user_id):
+        self._bump(self.user_key(user_id))
+
+    def invalidate_author(self, author_id):
+        self._bump(self.author_key(author_id))
+
+
+subscriptions_cache = SubscriptionsCache()
@@ -0,0 +1,103 @@
+import hashlib
+import json
+
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.utils.cache import (get_conditional_response, patch_cache_control,
+                                patch_vary_headers)
+from django.utils.http import http_date
+
+from recipes.models import Favorites, Ingredient, ShopCart, Tag
+from users.models import Fallow, UserFoodgram
+from .cache import ingredients_cache, tags_cache
+
+# Модели состояния пользователя и поле с датой добавления.
+USER_STATE = {
+    "favorites": (Favorites, "added"),
+    "shopping_cart": (ShopCart, "added"),
+    "subscriptions": (Fallow, "date_added"),
+}
+
+
+def make_etag(*parts):
+    digest = hashlib.md5(
+        json.dumps(parts, default=str, sort_keys=True).encode(),
+        usedforsecurity=False,
+    ).hexdigest()
+    return f'"{digest}"'
+
+
+def user_state_version(user):
+    """Версия избранного, корзины и подписок пользователя одним запросом.
+
+    Число строк и время последнего добавления: удаление меняет число,
+    добавление — время, поэтому любое изменение даёт новую версию.
+    """
+    if user.is_anonymous:
+        return None
+    annotations = {}
+    for name, (model, field) in USER_STATE.items():
+        rows = model.objects.filter(
+            user=OuterRef("pk")
+        ).order_by().values("user")
+        annotations[f"{name}_count"] = Subquery(
+            rows.annotate(value=Count("pk")).values("value")
+        )
+        annotations[f"{name}_added"] = Subquery(
+            rows.annotate(value=Max(field)).values("value")
+        )
+    state = UserFoodgram.objects.filter(pk=user.pk).annotate(
+        **annotations
+    ).values(*annotations).first()
+    return make_etag(state).strip('"')
+
+
+def catalogue_etag(cache, model, fields):
+    """ETag справочника по его содержимому.
+
+    Хранится в кеше справочника и пересчитывается при смене его версии.
+    """
+    return cache.get("etag", lambda: make_etag(list(
+        model.objects.order_by("pk").values_list(*fields)
+    )))
+
+
+def tags_etag():
+    return catalogue_etag(tags_cache, Tag, ("pk", "name", "color", "slug"))
+
+
+def ingredients_etag():
+    return catalogue_etag(
+        ingredients_cache, Ingredient, ("pk", "name", "measurement_unit")
+    )
+
+
+def not_modified(request, etag, last_modified=None):
+    """Ответ 304, если у клиента актуальная версия, иначе None."""
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=last_modified and int(last_modified.timestamp()),
+    )
+
+
+def set_validators(response, etag, last_modified=None, public=False,
+                   max_age=None):
+    """Заголовки ETag, Last-Modified и Cache-Control для ответа.
+
+    Общие для всех пользователей ответы помечаются public,
+    без max_age кеш должен перепроверять их по ETag.
+    """
+    if response.status_code not in (200, 304):
+        return response
+    response["ETag"] = etag
+    if last_modified is not None:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    if public and max_age is not None:
+        patch_cache_control(response, public=True, max_age=max_age)
+    elif public:
+        patch_cache_control(response, public=True, no_cache=True)
+    else:
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ["Authorization"])
+    return response
+
@@ -1,11 +1,23 @@
+from django.conf import settings
+from django.db.models import Exists, OuterRef
 from django_filters import rest_framework as filters
 
-from recipes.models import Ingredient, Recipe, Tag
+from recipes.models import Ingredient, Recipe, TagInRecipe
+from .cache import get_tag_ids_by_slugs, get_tags
+from .search import search_ingredients
+
+
+def tag_choices():
+    return [(tag.slug, tag.name) for tag in get_tags().values()]
 
 
 class IngredientFilter(filters.FilterSet):
 
-    name = filters.CharFilter(lookup_expr='startswith')
+    name = filters.CharFilter(method='search_by_name')
+
+    def search_by_name(self, queryset, name, value):
+        return search_ingredients(
+            queryset, value, settings.INGREDIENT_SEARCH_LIMIT)
 
     class Meta:
         model = Ingredient
@@ -14,15 +26,23 @@ class IngredientFilter(filters.FilterSet):
 
 class RecipeFilter(filters.FilterSet):
 
-    tags = filters.ModelMultipleChoiceFilter(
-        queryset=Tag.objects.all(),
-        field_name='tags__slug',
-        to_field_name='slug')
+    tags = filters.MultipleChoiceFilter(
+        choices=tag_choices,
+        method='filter_tags')
     is_favorited = filters.BooleanFilter(
         method='is_recipe_in_favorites_filter')
     is_in_shopping_cart = filters.BooleanFilter(
         method='is_recipe_in_shoppingcart_filter')
 
+    def filter_tags(self, queryset, name, value):
+        """Рецепты с любым из тегов: EXISTS вместо JOIN, без дублей."""
+        tag_ids = get_tag_ids_by_slugs(value)
+        return queryset.filter(Exists(
+            TagInRecipe.objects.filter(
+                recipe=OuterRef('pk'), tag_id__in=tag_ids
+            )
+        ))
+
     def is_recipe_in_favorites_filter(self, queryset, name, value):
         if value:
             user = self.request.user
@@ -0,0 +1,109 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from recipes.models import Recipe
+from .cache import subscriptions_cache
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.IMAGE_WORKERS,
+                thread_name_prefix="image-renditions",
+            )
+        return _executor
+
+
+def render(image_file, size, image_format):
+    """Уменьшенная копия изображения в заданном формате."""
+    with Image.open(image_file) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(size, Image.LANCZOS)
+        if image.mode not in ("RGB", "RGBA") or image_format == "JPEG":
+            image = image.convert("RGB")
+        buffer = BytesIO()
+        image.save(buffer, image_format, quality=settings.IMAGE_QUALITY)
+        return buffer.getvalue()
+
+
+def delete_renditions(paths):
+    """Удаляет файлы копий; отсутствующие файлы пропускаются."""
+    storage = Recipe._meta.get_field("image").storage
+    for path in paths:
+        storage.delete(path)
+
+
+def generate_renditions(recipe_id, obsolete=()):
+    """Создаёт все копии изображения рецепта и сохраняет их адреса.
+
+    obsolete — пути копий прежнего изображения, они удаляются
+    из хранилища после сохранения новых.
+    """
+    recipe = Recipe.objects.filter(pk=recipe_id).only(
+        "image", "author_id"
+    ).first()
+    if recipe is None or not recipe.image:
+        delete_renditions(obsolete)
+        return {}
+    image_format = settings.IMAGE_RENDITION_FORMAT
+    extension = image_format.lower()
+    stem, _ = os.path.splitext(recipe.image.name)
+    storage = recipe.image.storage
+    renditions = {}
+    for name, size in settings.IMAGE_RENDITIONS.items():
+        with recipe.image.open("rb") as image_file:
+            content = render(image_file, size, image_format)
+        path = f"{stem}_{name}.{extension}"
+        if storage.exists(path):
+            storage.delete(path)
+        renditions[name] = storage.save(path, ContentFile(content))
+    # Изображение могли заменить, пока шла обработка: тогда копии
+    # уже не нужны, их пересоздаст обработка нового изображения.
+    updated = Recipe.objects.filter(
+        pk=recipe_id, image=recipe.image.name
+    ).update(image_renditions=renditions, updated=timezone.now())
+    if not updated:
+        delete_renditions([*renditions.values(), *obsolete])
+        return {}
+    # update() не отправляет post_save, а адреса копий есть
+    # в закешированных ответах подписок.
+    subscriptions_cache.invalidate_author(recipe.author_id)
+    delete_renditions(set(obsolete) - set(renditions.values()))
+    return renditions
+
+
+def _generate_in_worker(recipe_id, obsolete):
+    close_old_connections()
+    try:
+        generate_renditions(recipe_id, obsolete)
+    except Exception:
+        logger.exception("Не удалось обработать изображение рецепта %s",
+                         recipe_id)
+    finally:
+        close_old_connections()
+
+
+def schedule_renditions(recipe_id, obsolete=()):
+    """Ставит обработку изображения в фоновый пул после коммита."""
+    obsolete = list(obsolete)
+    transaction.on_commit(
+        lambda: get_executor().submit(
+            _generate_in_worker, recipe_id, obsolete
+        )
+    )
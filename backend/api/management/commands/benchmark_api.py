@@ -0,0 +1,149 @@
+import json
+import platform
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from api.metrics import QueryCounter
+from recipes.models import Ingredient, Recipe, ShopCart, Tag
+from users.models import Fallow, UserFoodgram
+
+# PNG 1x1 для сценария создания рецепта.
+IMAGE = (
+    "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAIAAACQd1PeAAAADE"
+    "lEQVR4nGM4UWEDAAOIAX3sK7CeAAAAAElFTkSuQmCC"
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Замер пропускной способности, задержек и числа SQL-запросов "
+        "основных эндпоинтов API через настоящие маршруты, в процессе. "
+        "Результат печатается в JSON. Изменения откатываются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--warmup", type=int, default=10)
+        parser.add_argument(
+            "--scenario", action="append", dest="scenarios",
+            help="Запустить только этот сценарий (можно несколько раз).",
+        )
+        parser.add_argument("--output", help="Файл для JSON-отчёта.")
+
+    def pick_user(self):
+        """Пользователь с подписками и корзиной, как у живого клиента."""
+        user = UserFoodgram.objects.filter(
+            pk__in=Fallow.objects.values("user")
+        ).filter(pk__in=ShopCart.objects.values("user")).first()
+        if user is None:
+            raise CommandError(
+                "Нет данных для замера, запустите generate_data"
+            )
+        return user
+
+    def scenarios(self, user):
+        tag = Tag.objects.first()
+        recipe = Recipe.objects.order_by("-id").first()
+        ingredients = list(Ingredient.objects.values_list("id", flat=True)[:5])
+        ingredient = Ingredient.objects.order_by("?").first()
+        query = ingredient.name[:4]
+
+        def create_body(number):
+            return {
+                "name": f"benchmark {number}",
+                "text": "benchmark",
+                "cooking_time": 10,
+                "image": IMAGE,
+                "tags": [tag.id],
+                "ingredients": [
+                    {"id": pk, "amount": 10} for pk in ingredients
+                ],
+            }
+
+        return {
+            "recipes_list": ("get", "/api/recipes/", {}),
+            "recipes_list_tags": (
+                "get", "/api/recipes/", {"tags": tag.slug},
+            ),
+            "recipes_list_favorited": (
+                "get", "/api/recipes/", {"is_favorited": 1},
+            ),
+            "recipes_list_author": (
+                "get", "/api/recipes/", {"author": recipe.author_id},
+            ),
+            "recipes_retrieve": ("get", f"/api/recipes/{recipe.id}/", {}),
+            "recipes_create": ("post", "/api/recipes/", create_body),
+            "subscriptions": (
+                "get", "/api/users/subscriptions/", {"recipes_limit": 3},
+            ),
+            "download_shopping_cart": (
+                "get", "/api/recipes/download_shopping_cart/", {},
+            ),
+            "ingredient_search": ("get", "/api/ingredients/", {"name": query}),
+        }
+
+    def run_scenario(self, client, method, url, data, options):
+        timings, queries, statuses = [], [], {}
+        for number in range(options["warmup"] + options["requests"]):
+            body = data(number) if callable(data) else data
+            with QueryCounter().install() as counter:
+                started = time.perf_counter()
+                response = getattr(client, method)(url, body, format="json")
+                if response.streaming:
+                    b"".join(response.streaming_content)
+                elapsed = time.perf_counter() - started
+            if number < options["warmup"]:
+                continue
+            timings.append(elapsed * 1000)
+            queries.append(counter.count)
+            statuses[response.status_code] = (
+                statuses.get(response.status_code, 0) + 1
+            )
+        percentiles = statistics.quantiles(timings, n=100)
+        return {
+            "requests": len(timings),
+            "throughput_rps": round(len(timings) / (sum(timings) / 1000), 1),
+            "p50_ms": round(percentiles[49], 2),
+            "p95_ms": round(percentiles[94], 2),
+            "p99_ms": round(percentiles[98], 2),
+            "queries_avg": round(statistics.mean(queries), 2),
+            "queries_max": max(queries),
+            "statuses": statuses,
+        }
+
+    @override_settings(ALLOWED_HOSTS=["*"], QUERY_BUDGET_STRICT=False)
+    def handle(self, *args, **options):
+        if options["requests"] < 2:
+            raise CommandError("Нужно хотя бы 2 запроса на сценарий")
+        user = self.pick_user()
+        client = APIClient()
+        client.force_authenticate(user)
+        report = {
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "debug": settings.DEBUG,
+            "recipes": Recipe.objects.count(),
+            "users": UserFoodgram.objects.count(),
+            "results": {},
+        }
+        with transaction.atomic():
+            scenarios = self.scenarios(user)
+            for name in options["scenarios"] or scenarios:
+                if name not in scenarios:
+                    raise CommandError(f"Неизвестный сценарий: {name}")
+                self.stderr.write(f"{name}...")
+                report["results"][name] = self.run_scenario(
+                    client, *scenarios[name], options
+                )
+            transaction.set_rollback(True)
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                file.write(output)
+        self.stdout.write(output)
@@ -0,0 +1,80 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory
+
+from api.cache import ingredients_cache
+from api.views import IngredientsViewSet
+from recipes.models import Ingredient
+
+SYLLABLES = (
+    "ка", "ро", "ми", "ла", "то", "не", "са", "ве", "бу", "ры",
+    "пе", "ць", "гу", "до", "ша", "мо", "ли", "ко", "ст", "ан",
+)
+UNITS = ("г", "кг", "мл", "л", "шт.", "ст. л.", "ч. л.", "по вкусу")
+
+
+def synthetic_ingredients(rng, rows):
+    """rows ингредиентов со случайными названиями из слогов.
+
+    Пары название и единица не повторяются: их уникальность требует
+    ограничение unique_ingredient.
+    """
+    pairs = {}
+    while len(pairs) < rows:
+        name = " ".join(
+            "".join(rng.choices(SYLLABLES, k=rng.randint(2, 4)))
+            for _ in range(rng.randint(1, 3))
+        )
+        pairs[name, rng.choice(UNITS)] = None
+    return [
+        Ingredient(name=name, measurement_unit=unit)
+        for name, unit in pairs
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Замер задержки поиска ингредиентов на синтетическом каталоге. "
+        "Данные создаются в транзакции и откатываются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10000)
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        with transaction.atomic():
+            Ingredient.objects.bulk_create(
+                synthetic_ingredients(rng, options["rows"]),
+                batch_size=1000,
+                ignore_conflicts=True,
+            )
+            ingredients_cache.bump()
+            names = list(Ingredient.objects.values_list("name", flat=True))
+            queries = []
+            for _ in range(options["requests"]):
+                name = rng.choice(names)
+                queries.append(name[:rng.randint(1, min(len(name), 8))])
+            view = IngredientsViewSet.as_view({"get": "list"})
+            factory = APIRequestFactory()
+            view(factory.get("/api/ingredients/", {"name": queries[0]}))
+            timings = []
+            for query in queries:
+                request = factory.get("/api/ingredients/", {"name": query})
+                started = time.perf_counter()
+                view(request).render()
+                timings.append((time.perf_counter() - started) * 1000)
+            transaction.set_rollback(True)
+        ingredients_cache.bump()
+        percentiles = statistics.quantiles(timings, n=100)
+        self.stdout.write(
+            f"rows={options['rows']} requests={len(timings)} "
+            f"p50={percentiles[49]:.2f}ms p95={percentiles[94]:.2f}ms "
+            f"p99={percentiles[98]:.2f}ms max={max(timings):.2f}ms"
+        )
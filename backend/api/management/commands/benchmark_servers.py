@@ -0,0 +1,287 @@
+import http.client
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from rest_framework.authtoken.models import Token
+
+from recipes.models import Ingredient, Recipe, ShopCart, Tag
+from users.models import Fallow, UserFoodgram
+
+SERVERS = {
+    "wsgi": [
+        sys.executable, "-m", "gunicorn", "backend.wsgi",
+        "--bind", "127.0.0.1:{port}", "--workers", "{workers}",
+        "--log-level", "warning",
+    ],
+    "asgi": [
+        sys.executable, "-m", "uvicorn", "backend.asgi:application",
+        "--host", "127.0.0.1", "--port", "{port}", "--workers", "{workers}",
+        "--log-level", "warning",
+    ],
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def process_tree(pid):
+    """pid процесса и всех его потомков по /proc."""
+    children = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as file:
+                stat = file.read()
+        except OSError:
+            continue
+        parent = int(stat.rsplit(")", 1)[1].split()[1])
+        children.setdefault(parent, []).append(int(name))
+    tree, stack = [], [pid]
+    while stack:
+        current = stack.pop()
+        tree.append(current)
+        stack.extend(children.get(current, ()))
+    return tree
+
+
+def rss_kb(pid):
+    """Суммарный RSS сервера: мастер-процесс и воркеры."""
+    total = 0
+    for current in process_tree(pid):
+        try:
+            with open(f"/proc/{current}/status") as file:
+                for line in file:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+        except OSError:
+            continue
+    return total
+
+
+class Server:
+    """Сервер в дочернем процессе на свободном порту."""
+
+    def __init__(self, mode, workers, timeout):
+        self.mode = mode
+        self.port = free_port()
+        self.timeout = timeout
+        self.command = [
+            part.format(port=self.port, workers=workers)
+            for part in SERVERS[mode]
+        ]
+
+    def __enter__(self):
+        env = dict(os.environ, ASYNC_VIEWS=str(self.mode == "asgi"))
+        self.process = subprocess.Popen(
+            self.command, cwd=settings.BASE_DIR, env=env,
+        )
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise CommandError(f"{self.mode}: сервер не запустился")
+            try:
+                status, _ = request(self.port, "/api/tags/", {})
+            except OSError:
+                time.sleep(0.2)
+                continue
+            if status == 200:
+                return self
+        self.stop()
+        raise CommandError(
+            f"{self.mode}: сервер не ответил за {self.timeout} с"
+        )
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def stop(self):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+
+    @property
+    def rss_kb(self):
+        return rss_kb(self.process.pid)
+
+
+def request(port, url, headers, connection=None):
+    conn = connection or http.client.HTTPConnection(
+        "127.0.0.1", port, timeout=30
+    )
+    try:
+        conn.request("GET", url, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        return response.status, conn
+    except Exception:
+        conn.close()
+        raise
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнение синхронных воркеров gunicorn и ASGI-режима (uvicorn "
+        "с асинхронными представлениями): запросы в секунду, задержки "
+        "и память на одно одновременное соединение. Результат в JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--mode", action="append", dest="modes", choices=SERVERS,
+            help="Замерить только этот режим (можно несколько раз).",
+        )
+        parser.add_argument(
+            "--concurrency", action="append", type=int,
+            help="Число одновременных соединений (можно несколько раз), "
+                 "по умолчанию 1, 10 и 50.",
+        )
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument(
+            "--workers", type=int, default=os.cpu_count() or 1,
+            help="Число воркеров сервера, по умолчанию по числу CPU.",
+        )
+        parser.add_argument(
+            "--auth", action="store_true",
+            help="Запросы с токеном пользователя с подписками и корзиной.",
+        )
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument("--output", help="Файл для JSON-отчёта.")
+
+    def urls(self):
+        tag = Tag.objects.first()
+        recipe = Recipe.objects.order_by("-id").first()
+        ingredient = Ingredient.objects.order_by("?").first()
+        if recipe is None or tag is None or ingredient is None:
+            raise CommandError(
+                "Нет данных для замера, запустите generate_data"
+            )
+        return [
+            "/api/recipes/",
+            f"/api/recipes/?tags={tag.slug}",
+            f"/api/recipes/{recipe.id}/",
+            f"/api/ingredients/?name={ingredient.name[:4]}",
+            "/api/tags/",
+        ]
+
+    def headers(self, auth):
+        if not auth:
+            return {}
+        user = UserFoodgram.objects.filter(
+            pk__in=Fallow.objects.values("user")
+        ).filter(pk__in=ShopCart.objects.values("user")).first()
+        if user is None:
+            raise CommandError(
+                "Нет данных для замера, запустите generate_data"
+            )
+        token, _ = Token.objects.get_or_create(user=user)
+        return {"Authorization": f"Token {token.key}"}
+
+    def run_level(self, server, urls, headers, concurrency, total):
+        """total запросов по кругу из urls в concurrency потоков;
+        каждый поток держит своё соединение, пока сервер его не закроет."""
+        timings, statuses = [], {}
+        lock = threading.Lock()
+        counter = iter(range(total))
+        peak = [server.rss_kb]
+        done = threading.Event()
+
+        def sample():
+            while not done.wait(0.05):
+                peak[0] = max(peak[0], server.rss_kb)
+
+        def worker():
+            conn = None
+            for number in counter:
+                started = time.perf_counter()
+                try:
+                    status, conn = request(
+                        server.port, urls[number % len(urls)], headers, conn
+                    )
+                except (OSError, http.client.HTTPException):
+                    status, conn = "error", None
+                elapsed = time.perf_counter() - started
+                with lock:
+                    timings.append(elapsed * 1000)
+                    statuses[status] = statuses.get(status, 0) + 1
+            if conn is not None:
+                conn.close()
+
+        idle = server.rss_kb
+        sampler = threading.Thread(target=sample, daemon=True)
+        sampler.start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            for _ in range(concurrency):
+                pool.submit(worker)
+        duration = time.perf_counter() - started
+        done.set()
+        sampler.join()
+        percentiles = statistics.quantiles(timings, n=100)
+        return {
+            "requests": len(timings),
+            "throughput_rps": round(len(timings) / duration, 1),
+            "p50_ms": round(percentiles[49], 2),
+            "p95_ms": round(percentiles[94], 2),
+            "p99_ms": round(percentiles[98], 2),
+            "statuses": {str(key): value for key, value in statuses.items()},
+            "rss_idle_kb": idle,
+            "rss_peak_kb": peak[0],
+            "rss_per_connection_kb": round(
+                max(peak[0] - idle, 0) / concurrency, 1
+            ),
+        }
+
+    def handle(self, *args, **options):
+        if options["requests"] < 2:
+            raise CommandError("Нужно хотя бы 2 запроса на уровень")
+        if not os.path.isdir("/proc"):
+            raise CommandError("Для замера памяти нужен /proc (Linux)")
+        levels = options["concurrency"] or [1, 10, 50]
+        urls = self.urls()
+        headers = self.headers(options["auth"])
+        report = {
+            "database": connection.vendor,
+            "python": platform.python_version(),
+            "workers": options["workers"],
+            "auth": options["auth"],
+            "urls": urls,
+            "results": {},
+        }
+        # Серверы открывают свои соединения, наше больше не нужно.
+        connection.close()
+        for mode in options["modes"] or SERVERS:
+            results = report["results"][mode] = {}
+            server = Server(mode, options["workers"], options["timeout"])
+            with server:
+                # Прогрев: импорты, кэши справочников и соединения с БД.
+                for url in urls:
+                    request(server.port, url, headers)[1].close()
+                for concurrency in levels:
+                    self.stderr.write(f"{mode}, {concurrency} соединений...")
+                    results[concurrency] = self.run_level(
+                        server, urls, headers, concurrency,
+                        max(options["requests"], concurrency),
+                    )
+        output = json.dumps(report, ensure_ascii=False, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                file.write(output)
+        self.stdout.write(output)
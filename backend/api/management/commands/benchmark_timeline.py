@@ -0,0 +1,130 @@
+import statistics
+import time
+from urllib.parse import parse_qs, urlsplit
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.views import RecipeViewSet
+from recipes import timeline
+from recipes.models import Recipe
+from users.models import Fallow, UserFoodgram
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнение стратегий ленты подписок (read/write) на синтетических "
+        "данных. Данные создаются в транзакции и откатываются."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--followers", type=int, default=10000)
+        parser.add_argument("--authors", type=int, default=50)
+        parser.add_argument("--recipes", type=int, default=20)
+        parser.add_argument("--requests", type=int, default=100)
+
+    def percentiles(self, timings):
+        values = statistics.quantiles(timings, n=100)
+        return f"p50={values[49]:.2f}ms p95={values[94]:.2f}ms"
+
+    def create_users(self, prefix, count):
+        password = make_password(None)
+        UserFoodgram.objects.bulk_create(
+            [
+                UserFoodgram(
+                    username=f"{prefix}{number}",
+                    email=f"{prefix}{number}@bench.local",
+                    first_name="bench",
+                    last_name="bench",
+                    password=password,
+                )
+                for number in range(count)
+            ],
+            batch_size=1000,
+        )
+        return list(UserFoodgram.objects.filter(
+            username__startswith=prefix
+        ).values_list("id", flat=True))
+
+    @override_settings(ALLOWED_HOSTS=["*"])
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            author_ids = self.create_users("bench_author_", options["authors"])
+            follower_ids = self.create_users(
+                "bench_follower_", options["followers"]
+            )
+            reader = UserFoodgram.objects.get(pk=follower_ids[0])
+            Recipe.objects.bulk_create(
+                [
+                    Recipe(author_id=author_id, name=f"bench {number}",
+                           text="bench", cooking_time=1)
+                    for author_id in author_ids
+                    for number in range(options["recipes"])
+                ],
+                batch_size=1000,
+            )
+            Fallow.objects.bulk_create(
+                [Fallow(user_id=user_id, author_id=author_ids[0])
+                 for user_id in follower_ids]
+                + [Fallow(user_id=reader.id, author_id=author_id)
+                   for author_id in author_ids[1:]],
+                batch_size=1000,
+            )
+            UserFoodgram.objects.filter(pk=author_ids[0]).update(
+                followers_count=len(follower_ids)
+            )
+            for strategy in ("read", "write"):
+                with override_settings(TIMELINE_STRATEGY=strategy):
+                    self.run_strategy(strategy, reader, author_ids, options)
+            transaction.set_rollback(True)
+
+    def run_strategy(self, strategy, reader, author_ids, options):
+        if strategy == "write":
+            for author_id in author_ids:
+                timeline.follow(reader.id, author_id)
+        publish = []
+        for number in range(5):
+            recipe = Recipe.objects.create(
+                author_id=author_ids[0], name=f"publish {number}",
+                text="bench", cooking_time=1,
+            )
+            started = time.perf_counter()
+            timeline.fan_out(recipe)
+            publish.append((time.perf_counter() - started) * 1000)
+        view = RecipeViewSet.as_view({"get": "timeline"})
+        factory = APIRequestFactory()
+        results = {}
+        for name, params in (("first page", {}), ("deep page", None)):
+            timings, queries = [], 0
+            for _ in range(options["requests"]):
+                request = factory.get(
+                    "/api/recipes/timeline/", params or {"limit": 6}
+                )
+                force_authenticate(request, user=reader)
+                with CaptureQueriesContext(connection) as context:
+                    started = time.perf_counter()
+                    response = view(request)
+                    response.render()
+                    timings.append((time.perf_counter() - started) * 1000)
+                queries = len(context.captured_queries)
+                if params is None and response.data["next"]:
+                    # Глубокая страница: идём на 50 страниц вглубь.
+                    for _ in range(50):
+                        query = parse_qs(urlsplit(response.data["next"]).query)
+                        params = {
+                            key: value[0] for key, value in query.items()
+                        }
+                        request = factory.get("/api/recipes/timeline/", params)
+                        force_authenticate(request, user=reader)
+                        response = view(request)
+                        if not response.data["next"]:
+                            break
+            results[name] = f"{self.percentiles(timings)} queries={queries}"
+        self.stdout.write(
+            f"{strategy}: publish to {options['followers']} followers "
+            f"avg={statistics.mean(publish):.2f}ms; "
+            + "; ".join(f"{name} {value}" for name, value in results.items())
+        )
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.utils import CartTotalsService
+
+
+class Command(BaseCommand):
+    help = "Проверка и пересборка таблицы итогов списков покупок."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Только найти расхождения, ничего не меняя.",
+        )
+        parser.add_argument(
+            "--user",
+            type=int,
+            action="append",
+            dest="users",
+            help="id пользователя (можно несколько раз).",
+        )
+
+    def handle(self, *args, **options):
+        users = options["users"]
+        drift = CartTotalsService.drift(users)
+        for (user_id, ingredient_id), (stored, expected) in sorted(
+            drift.items()
+        ):
+            self.stdout.write(
+                f"user={user_id} ingredient={ingredient_id}: "
+                f"{stored} != {expected}"
+            )
+        if options["check"]:
+            if drift:
+                raise CommandError(f"Найдено расхождений: {len(drift)}")
+            self.stdout.write(self.style.SUCCESS("Расхождений нет"))
+            return
+        with transaction.atomic():
+            CartTotalsService.rebuild(users)
+        self.stdout.write(self.style.SUCCESS(
+            f"Итоги пересобраны, исправлено расхождений: {len(drift)}"
+        ))
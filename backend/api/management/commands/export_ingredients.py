@@ -0,0 +1,47 @@
+import csv
+import json
+import sys
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from recipes.models import Ingredient
+
+
+class Command(BaseCommand):
+    help = "Выгрузка каталога ингредиентов в CSV, JSON или JSON Lines."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path", type=Path, nargs="?",
+            help="Файл для выгрузки, по умолчанию stdout.",
+        )
+        parser.add_argument(
+            "--format", choices=("csv", "json", "jsonl"), default="csv"
+        )
+
+    def write(self, file, file_format):
+        rows = Ingredient.objects.order_by("name", "measurement_unit")
+        rows = rows.values_list("name", "measurement_unit").iterator(
+            chunk_size=5000
+        )
+        if file_format == "csv":
+            csv.writer(file).writerows(rows)
+            return
+        if file_format == "json":
+            file.write("[")
+        separator = "" if file_format == "jsonl" else "\n"
+        for name, unit in rows:
+            file.write(separator + json.dumps(
+                {"name": name, "measurement_unit": unit}, ensure_ascii=False
+            ))
+            separator = "\n" if file_format == "jsonl" else ",\n"
+        file.write("\n]\n" if file_format == "json" else "\n")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if path is None:
+            self.write(sys.stdout, options["format"])
+            return
+        with path.open("w", encoding="utf-8", newline="") as file:
+            self.write(file, options["format"])
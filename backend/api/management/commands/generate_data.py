@@ -0,0 +1,212 @@
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.cache import ingredients_cache, tags_cache
+from api.utils import CartTotalsService
+from recipes.models import (Favorites, Ingredient, IngredientInRecipe, Recipe,
+                            ShopCart, Tag, TagInRecipe)
+from users.models import Fallow, UserFoodgram
+
+PREFIX = "synthetic"
+UNITS = ("г", "кг", "мл", "л", "шт.", "ст. л.", "ч. л.", "по вкусу")
+IMAGE = "recipes/images/synthetic.png"
+# PNG 1x1, общий для всех синтетических рецептов.
+PIXEL = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010802000000907753"
+    "de0000000c49444154789c6338516103000388017dec2bb09e0000000049454e"
+    "44ae426082"
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Генерация синтетических пользователей, тегов, ингредиентов, "
+        "рецептов, избранного, корзин и подписок для нагрузочных тестов."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--recipes", type=int, default=1000)
+        parser.add_argument("--ingredients", type=int, default=2000)
+        parser.add_argument("--tags", type=int, default=10)
+        parser.add_argument(
+            "--favorites", type=int, default=20,
+            help="Среднее число рецептов в избранном у пользователя.",
+        )
+        parser.add_argument(
+            "--cart", type=int, default=5,
+            help="Среднее число рецептов в корзине у пользователя.",
+        )
+        parser.add_argument(
+            "--follows", type=int, default=10,
+            help="Среднее число подписок у пользователя.",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Удалить ранее сгенерированные данные перед генерацией.",
+        )
+
+    def log(self, message):
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(f"[{elapsed:7.1f}s] {message}")
+
+    def handle(self, *args, **options):
+        self.started = time.monotonic()
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        if options["clear"]:
+            self.clear()
+        if not default_storage.exists(IMAGE):
+            default_storage.save(IMAGE, ContentFile(PIXEL))
+        with transaction.atomic():
+            user_ids = self.create_users(options["users"])
+            tag_ids = self.create_tags(options["tags"])
+            ingredient_ids = self.create_ingredients(options["ingredients"])
+            recipe_ids = self.create_recipes(
+                options["recipes"], user_ids, tag_ids, ingredient_ids
+            )
+            for model, average in ((Favorites, options["favorites"]),
+                                   (ShopCart, options["cart"])):
+                self.create_links(
+                    model, "recipe_id", user_ids, recipe_ids, average
+                )
+            self.create_links(
+                Fallow, "author_id", user_ids, user_ids, options["follows"]
+            )
+        self.log("Пересчёт счётчиков, итогов корзин и рейтинга")
+        call_command("recount_counters", stdout=self.stdout)
+        CartTotalsService.rebuild()
+        call_command("refresh_popularity", "--full", stdout=self.stdout)
+        tags_cache.bump()
+        ingredients_cache.bump()
+        self.log("Готово")
+
+    def clear(self):
+        with transaction.atomic():
+            UserFoodgram.objects.filter(
+                username__startswith=f"{PREFIX}_"
+            ).delete()
+            Tag.objects.filter(slug__startswith=f"{PREFIX}-").delete()
+            Ingredient.objects.filter(name__startswith=f"{PREFIX} ").delete()
+        self.log("Старые синтетические данные удалены")
+
+    def bulk_create(self, model, objects):
+        model.objects.bulk_create(
+            objects, batch_size=self.batch_size, ignore_conflicts=True
+        )
+
+    def create_users(self, count):
+        start = UserFoodgram.objects.filter(
+            username__startswith=f"{PREFIX}_"
+        ).count()
+        password = make_password(PREFIX)
+        self.bulk_create(UserFoodgram, [
+            UserFoodgram(
+                username=f"{PREFIX}_{number}",
+                email=f"{PREFIX}_{number}@example.com",
+                first_name="Синтетический",
+                last_name=f"Пользователь {number}",
+                password=password,
+            )
+            for number in range(start, start + count)
+        ])
+        self.log(f"Пользователей: {count} (пароль {PREFIX!r})")
+        return list(UserFoodgram.objects.filter(
+            username__startswith=f"{PREFIX}_"
+        ).values_list("id", flat=True))
+
+    def create_tags(self, count):
+        self.bulk_create(Tag, [
+            Tag(
+                name=f"{PREFIX} тег {number}",
+                color=f"#{self.rng.randrange(0x1000000):06X}",
+                slug=f"{PREFIX}-{number}",
+            )
+            for number in range(count)
+        ])
+        self.log(f"Тегов: {count}")
+        return list(Tag.objects.values_list("id", flat=True))
+
+    def create_ingredients(self, count):
+        self.bulk_create(Ingredient, [
+            Ingredient(
+                name=f"{PREFIX} ингредиент {number}",
+                measurement_unit=self.rng.choice(UNITS),
+            )
+            for number in range(count)
+        ])
+        self.log(f"Ингредиентов: {count}")
+        return list(Ingredient.objects.values_list("id", flat=True))
+
+    def create_recipes(self, count, user_ids, tag_ids, ingredient_ids):
+        """Рецепты порциями, чтобы на 1M не держать всё в памяти."""
+        rng = self.rng
+        created = 0
+        while created < count:
+            size = min(self.batch_size, count - created)
+            recipes = Recipe.objects.bulk_create([
+                Recipe(
+                    author_id=rng.choice(user_ids),
+                    name=f"{PREFIX} рецепт {created + number}",
+                    text="Синтетический рецепт для нагрузочных тестов.",
+                    image=IMAGE,
+                    cooking_time=rng.randint(5, 180),
+                )
+                for number in range(size)
+            ])
+            links, amounts = [], []
+            for recipe in recipes:
+                for tag_id in rng.sample(tag_ids, min(len(tag_ids), 2)):
+                    links.append(
+                        TagInRecipe(recipe_id=recipe.id, tag_id=tag_id)
+                    )
+                # В реальных рецептах обычно 5–10 ингредиентов.
+                number = round(rng.triangular(2, 20, 7))
+                for ingredient_id in rng.sample(
+                    ingredient_ids, min(len(ingredient_ids), number)
+                ):
+                    amounts.append(IngredientInRecipe(
+                        recipe_id=recipe.id,
+                        ingredient_id=ingredient_id,
+                        amount=rng.randint(1, 500),
+                    ))
+            self.bulk_create(TagInRecipe, links)
+            self.bulk_create(IngredientInRecipe, amounts)
+            created += size
+            self.log(f"Рецептов: {created}/{count}")
+        return list(Recipe.objects.filter(
+            name__startswith=f"{PREFIX} "
+        ).values_list("id", flat=True))
+
+    def create_links(self, model, field, user_ids, target_ids, average):
+        """Случайные связи пользователь → цель, в среднем average на
+        пользователя; самоподписки пропускаются."""
+        if not average or not target_ids:
+            return
+        rng = self.rng
+        batch, total = [], 0
+        for user_id in user_ids:
+            number = min(
+                len(target_ids), round(rng.expovariate(1 / average))
+            )
+            for target_id in rng.sample(target_ids, number):
+                if model is Fallow and target_id == user_id:
+                    continue
+                batch.append(model(user_id=user_id, **{field: target_id}))
+            if len(batch) >= self.batch_size:
+                self.bulk_create(model, batch)
+                total += len(batch)
+                batch = []
+        self.bulk_create(model, batch)
+        total += len(batch)
+        self.log(f"{model._meta.verbose_name_plural}: {total}")
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from api.images import generate_renditions
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Создание уменьшенных копий изображений рецептов."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Пересоздать копии и для рецептов, у которых они есть.",
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image="")
+        if not options["all"]:
+            recipes = recipes.filter(image_renditions={})
+        count = 0
+        for recipe_id in recipes.values_list("id", flat=True).iterator():
+            generate_renditions(recipe_id)
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Обработано рецептов: {count}"))
@@ -0,0 +1,178 @@
+import csv
+import io
+import json
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from api.cache import ingredients_cache
+from recipes.models import Ingredient
+
+NAME_LENGTH = Ingredient._meta.get_field("name").max_length
+UNIT_LENGTH = Ingredient._meta.get_field("measurement_unit").max_length
+HEADER = ("name", "measurement_unit")
+
+
+def iter_csv(file):
+    """Строки name,measurement_unit; строка заголовка пропускается."""
+    for number, row in enumerate(csv.reader(file)):
+        if len(row) < 2:
+            continue
+        if number == 0 and tuple(
+            column.strip().lower() for column in row[:2]
+        ) == HEADER:
+            continue
+        yield row[0], row[1]
+
+
+def iter_jsonl(file):
+    for line in file:
+        if line.strip():
+            item = json.loads(line)
+            yield item["name"], item["measurement_unit"]
+
+
+def iter_json(file, chunk_size=64 * 1024):
+    """Элементы JSON-массива по одному, без чтения файла целиком."""
+    decoder = json.JSONDecoder()
+    buffer, position, started = "", 0, False
+    while True:
+        chunk = file.read(chunk_size)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in " \t\r\n,":
+                position += 1
+            if not started:
+                if position == len(buffer):
+                    if not chunk:
+                        raise ValueError("Пустой файл, ожидался JSON-массив")
+                    break
+                if buffer[position] != "[":
+                    raise ValueError("Ожидался JSON-массив")
+                started = True
+                position += 1
+                continue
+            if position < len(buffer) and buffer[position] == "]":
+                return
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if not chunk:
+                    raise
+                break
+            yield item["name"], item["measurement_unit"]
+        if not chunk:
+            return
+
+
+READERS = {"csv": iter_csv, "json": iter_json, "jsonl": iter_jsonl}
+
+
+class Command(BaseCommand):
+    help = (
+        "Загрузка каталога ингредиентов из CSV (name,measurement_unit), "
+        "JSON-массива или JSON Lines с пропуском дубликатов."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", type=Path)
+        parser.add_argument("--format", choices=READERS)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--no-copy",
+            action="store_true",
+            help="Не использовать COPY даже на PostgreSQL.",
+        )
+
+    def iter_rows(self, path, file_format):
+        seen = set()
+        self.read = self.skipped = 0
+        with path.open(encoding="utf-8", newline="") as file:
+            for name, unit in READERS[file_format](file):
+                self.read += 1
+                name, unit = str(name).strip(), str(unit).strip()
+                key = (name, unit)
+                if (not name or len(name) > NAME_LENGTH
+                        or len(unit) > UNIT_LENGTH or key in seen):
+                    self.skipped += 1
+                    continue
+                seen.add(key)
+                yield key
+
+    def batches(self, rows, size):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def load_bulk_create(self, rows, batch_size):
+        for batch in self.batches(rows, batch_size):
+            Ingredient.objects.bulk_create(
+                [Ingredient(name=name, measurement_unit=unit)
+                 for name, unit in batch],
+                ignore_conflicts=True,
+            )
+
+    def load_copy(self, rows, batch_size):
+        """COPY во временную таблицу и одна вставка с ON CONFLICT."""
+        table = Ingredient._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "CREATE TEMP TABLE ingredient_import "
+                "(name varchar(200), measurement_unit varchar(200)) "
+                "ON COMMIT DROP"
+            )
+            for batch in self.batches(rows, batch_size):
+                buffer = io.StringIO()
+                csv.writer(buffer).writerows(batch)
+                buffer.seek(0)
+                cursor.copy_expert(
+                    "COPY ingredient_import FROM STDIN WITH (FORMAT csv)",
+                    buffer,
+                )
+            cursor.execute(
+                f"INSERT INTO {table} (name, measurement_unit) "
+                "SELECT name, measurement_unit FROM ingredient_import "
+                "ON CONFLICT DO NOTHING"
+            )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not path.exists():
+            raise CommandError(f"Файл {path} не найден")
+        file_format = options["format"] or path.suffix.lstrip(".").lower()
+        if file_format not in READERS:
+            raise CommandError(f"Неизвестный формат: {file_format}")
+        use_copy = connection.vendor == "postgresql" and not options["no_copy"]
+        started = time.monotonic()
+        before = Ingredient.objects.count()
+        rows = self.iter_rows(path, file_format)
+        try:
+            with transaction.atomic():
+                if use_copy:
+                    self.load_copy(rows, options["batch_size"])
+                else:
+                    self.load_bulk_create(rows, options["batch_size"])
+        except (ValueError, KeyError, TypeError) as error:
+            # UnicodeDecodeError и JSONDecodeError — подклассы ValueError.
+            raise CommandError(
+                f"Ошибка в {path} после {self.read} строк: "
+                f"{type(error).__name__}: {error}"
+            )
+        ingredients_cache.bump()
+        elapsed = time.monotonic() - started
+        added = Ingredient.objects.count() - before
+        rate = self.read / elapsed if elapsed else self.read
+        self.stdout.write(self.style.SUCCESS(
+            f"Прочитано: {self.read}, добавлено: {added}, "
+            f"пропущено дубликатов и ошибок: {self.skipped}, "
+            f"за {elapsed:.2f} с ({rate:.0f} строк/с, "
+            f"{'COPY' if use_copy else 'bulk_create'})"
+        ))
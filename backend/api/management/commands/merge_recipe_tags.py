@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from recipes.models import Recipe, TagInRecipe
+
+# Таблица, которую Django создавал для Recipe.tags до перехода
+# на модель связи TagInRecipe.
+OLD_TABLE = f"{Recipe._meta.db_table}_tags"
+
+
+class Command(BaseCommand):
+    help = (
+        "Перенос тегов рецептов из старой автоматической таблицы связи "
+        "в TagInRecipe. Без старой таблицы ничего не делает."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--drop",
+            action="store_true",
+            help="Удалить старую таблицу после переноса.",
+        )
+
+    def handle(self, *args, **options):
+        if OLD_TABLE not in connection.introspection.table_names():
+            self.stdout.write("Старой таблицы связи нет, переносить нечего")
+            return
+        table = TagInRecipe._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} (tag_id, recipe_id) "
+                f"SELECT tag_id, recipe_id FROM {OLD_TABLE} WHERE 1 = 1 "
+                f"ON CONFLICT DO NOTHING"
+            )
+            moved = cursor.rowcount
+            if options["drop"]:
+                cursor.execute(f"DROP TABLE {OLD_TABLE}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Перенесено связей: {moved}"
+            + (f", таблица {OLD_TABLE} удалена" if options["drop"] else "")
+        ))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.counters import reconcile_counter
+from recipes.models import Favorites, Recipe, ShopCart
+from users.models import Fallow, UserFoodgram
+
+COUNTERS = (
+    (Recipe, "favorites_count", Favorites, "recipe"),
+    (Recipe, "shopping_cart_count", ShopCart, "recipe"),
+    (UserFoodgram, "recipes_count", Recipe, "author"),
+    (UserFoodgram, "followers_count", Fallow, "author"),
+)
+
+
+class Command(BaseCommand):
+    help = "Сверка и исправление счётчиков рецептов и пользователей."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--check",
+            action="store_true",
+            help="Только найти расхождения, ничего не меняя.",
+        )
+
+    def handle(self, *args, **options):
+        fix = not options["check"]
+        total = 0
+        with transaction.atomic():
+            for model, field, related_model, related_field in COUNTERS:
+                drifted = reconcile_counter(
+                    model, field, related_model, related_field, fix=fix
+                )
+                total += drifted
+                self.stdout.write(
+                    f"{model.__name__}.{field}: расхождений {drifted}"
+                )
+        if not fix and total:
+            raise CommandError(f"Найдено расхождений: {total}")
+        self.stdout.write(self.style.SUCCESS(
+            "Счётчики исправлены" if fix else "Расхождений нет"
+        ))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.popularity import refresh
+
+
+class Command(BaseCommand):
+    help = "Пересчёт рейтинга популярности рецептов."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full",
+            action="store_true",
+            help="Пересчитать все рецепты, а не только изменившиеся.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--loop",
+            type=float,
+            metavar="SECONDS",
+            help="Повторять пересчёт с этим интервалом.",
+        )
+
+    def handle(self, *args, **options):
+        full = options["full"]
+        while True:
+            started = time.monotonic()
+            count = refresh(batch_size=options["batch_size"], full=full)
+            self.stdout.write(
+                f"Пересчитано рецептов: {count} "
+                f"за {time.monotonic() - started:.2f} с"
+            )
+            if not options["loop"]:
+                return
+            full = False
+            time.sleep(options["loop"])
@@ -0,0 +1,174 @@
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+from django.http import Http404, HttpResponse
+
+from backend.db.pool import pool_stats
+
+logger = logging.getLogger(__name__)
+
+FIELDS = (
+    ("requests", "Число запросов."),
+    ("queries", "Число SQL-запросов."),
+    ("sql_seconds", "Время выполнения SQL, секунд."),
+    ("render_seconds", "Время сериализации ответа в рендерере, секунд."),
+    ("seconds", "Полное время обработки, секунд."),
+    ("response_bytes", "Размер ответов, байт."),
+    ("budget_exceeded", "Число превышений бюджета запросов."),
+)
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Эндпоинт выполнил больше SQL-запросов, чем разрешено."""
+
+
+class QueryCounter:
+    """Обёртка execute_wrapper: считает запросы и их время."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+
+    @contextmanager
+    def install(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+
+class Registry:
+    """Накопленные метрики по эндпоинтам в памяти процесса."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = defaultdict(lambda: dict.fromkeys(
+            (name for name, _ in FIELDS), 0
+        ))
+
+    def observe(self, labels, **values):
+        with self.lock:
+            row = self.data[labels]
+            row["requests"] += 1
+            for name, value in values.items():
+                row[name] += value
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+    def render(self):
+        """Метрики в текстовом формате Prometheus."""
+        with self.lock:
+            rows = [(labels, dict(row)) for labels, row in self.data.items()]
+        lines = []
+        for name, description in FIELDS:
+            metric = f"foodgram_endpoint_{name}_total"
+            lines.append(f"# HELP {metric} {description}")
+            lines.append(f"# TYPE {metric} counter")
+            for (endpoint, method, code), row in sorted(rows):
+                lines.append(
+                    f'{metric}{{endpoint="{endpoint}",method="{method}",'
+                    f'status="{code}"}} {row[name]}'
+                )
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+POOL_FIELDS = (
+    ("size", "gauge", "Размер пула соединений."),
+    ("in_use", "gauge", "Занятые соединения."),
+    ("idle", "gauge", "Свободные открытые соединения."),
+    ("acquired", "counter", "Выдачи соединений из пула."),
+    ("connections_created", "counter", "Открытые пулом соединения."),
+    ("wait_seconds", "counter", "Ожидание свободного соединения, секунд."),
+    ("timeouts", "counter", "Отказы по таймауту ожидания."),
+)
+
+
+def render_pool_metrics():
+    """Насыщение пулов соединений в формате Prometheus."""
+    stats = pool_stats()
+    lines = []
+    for name, kind, description in POOL_FIELDS:
+        metric = f"foodgram_db_pool_{name}"
+        if kind == "counter":
+            metric += "_total"
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for alias, values in sorted(stats.items()):
+            lines.append(f'{metric}{{alias="{alias}"}} {values[name]}')
+    return "\n".join(lines) + "\n" if stats else ""
+
+
+def endpoint_name(request):
+    """Имя вида RecipeViewSet.list для view из resolver_match."""
+    match = request.resolver_match
+    if match is None:
+        return "unresolved"
+    view = match.func
+    cls = getattr(view, "cls", None)
+    if cls is None:
+        return match.view_name or view.__name__
+    actions = getattr(view, "actions", None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f"{cls.__name__}.{action}"
+
+
+def query_budget(endpoint):
+    return settings.QUERY_BUDGETS.get(
+        endpoint, settings.QUERY_BUDGET_DEFAULT
+    )
+
+
+def check_budget(endpoint, count, strict=None):
+    """Предупреждает о превышении бюджета, в строгом режиме падает."""
+    budget = query_budget(endpoint)
+    if budget is None or count <= budget:
+        return False
+    message = f"{endpoint}: {count} SQL-запросов при бюджете {budget}"
+    if settings.QUERY_BUDGET_STRICT if strict is None else strict:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+    return True
+
+
+@contextmanager
+def assert_max_queries(limit=None, endpoint=None):
+    """Проверка для тестов: блок выполняет не больше limit запросов.
+
+    Без limit берётся бюджет endpoint из QUERY_BUDGETS.
+    """
+    if limit is None:
+        limit = query_budget(endpoint)
+    with QueryCounter().install() as counter:
+        yield counter
+    if limit is not None and counter.count > limit:
+        raise QueryBudgetExceeded(
+            f"{endpoint or 'блок'}: {counter.count} SQL-запросов "
+            f"при бюджете {limit}"
+        )
+
+
+def metrics_view(request):
+    """Метрики для Prometheus, доступны только с METRICS_ALLOWED_IPS."""
+    if request.META.get("REMOTE_ADDR") not in settings.METRICS_ALLOWED_IPS:
+        raise Http404
+    return HttpResponse(
+        registry.render() + render_pool_metrics(),
+        content_type="text/plain; version=0.0.4",
+    )
@@ -0,0 +1,69 @@
+import time
+
+from asgiref.sync import (iscoroutinefunction, markcoroutinefunction,
+                          sync_to_async)
+
+from .metrics import QueryCounter, check_budget, endpoint_name, registry
+
+
+class InstrumentationMiddleware:
+    """Число и время SQL-запросов, время рендеринга и размер ответа
+    по каждому эндпоинту.
+
+    Под ASGI ORM работает через sync_to_async, а все такие вызовы
+    одного запроса выполняются в его собственном потоке
+    (ThreadSensitiveContext): счётчик ставится на соединения этого
+    потока и видит запросы как async-, так и sync-представлений.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        request._render_seconds = 0.0
+        with QueryCounter().install() as counter:
+            response = self.get_response(request)
+        self.observe(request, response, started, counter)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        request._render_seconds = 0.0
+        installed = QueryCounter().install()
+        counter = await sync_to_async(installed.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(installed.__exit__)(None, None, None)
+        self.observe(request, response, started, counter)
+        return response
+
+    def observe(self, request, response, started, counter):
+        endpoint = endpoint_name(request)
+        exceeded = check_budget(endpoint, counter.count)
+        registry.observe(
+            (endpoint, request.method, response.status_code),
+            queries=counter.count,
+            sql_seconds=counter.seconds,
+            render_seconds=request._render_seconds,
+            seconds=time.perf_counter() - started,
+            response_bytes=0 if response.streaming else len(response.content),
+            budget_exceeded=int(exceeded),
+        )
+
+    def process_template_response(self, request, response):
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._render_seconds = time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
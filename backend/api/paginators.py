@@ -1,6 +1,230 @@
+import base64
+import json
+from datetime import datetime
+from functools import partial
+
+from django.core.paginator import InvalidPage, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def approximate_count(queryset):
+    """Оценка числа строк по плану запроса PostgreSQL.
+
+    На остальных базах выполняется обычный COUNT(*).
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql":
+        return queryset.count()
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]["Plan Rows"]
+
+
+class ApproximateCountPaginator(Paginator):
+
+    @cached_property
+    def count(self):
+        return approximate_count(self.object_list)
+
+
+class KnownCountPaginator(Paginator):
+    """Paginator с числом строк, уже посчитанным представлением."""
+
+    def __init__(self, object_list, per_page, count, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count = count
 
 
 class CustomPagination(PageNumberPagination):
+    """Постраничная пагинация ?page=&limit=.
+
+    ?cursor= включает курсорный режим по (created, id): страница
+    строится условием по ключу вместо OFFSET. ?count=exact|approx|none
+    задаёт способ подсчёта общего числа рецептов в обоих режимах;
+    по умолчанию exact для страниц и none для курсора. Без подсчёта
+    в ответе нет count, а ссылка next строится по лишней записи.
+    Точное число, уже известное представлению, передаётся в known_count
+    и заменяет COUNT(*).
+    """
 
     page_size_query_param = "limit"
+    cursor_query_param = "cursor"
+    cursor_only = False
+    count_query_param = "count"
+    cursor_ordering = ("-created", "-id")
+    invalid_cursor_message = "Неверный курсор."
+    uncounted = False
+    known_count = None
+
+    def get_count_mode(self, request, default):
+        mode = request.query_params.get(self.count_query_param, default)
+        return mode if mode in ("exact", "approx", "none") else default
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.cursor_mode = bool(self.cursor_query_param) and (
+            self.cursor_only
+            or self.cursor_query_param in request.query_params
+        )
+        if self.cursor_mode:
+            return self.paginate_cursor(queryset, request)
+        count_mode = self.get_count_mode(request, "exact")
+        self.uncounted = count_mode == "none"
+        if self.uncounted:
+            return self.paginate_uncounted(queryset, request)
+        if count_mode == "approx":
+            self.django_paginator_class = ApproximateCountPaginator
+        elif self.known_count is not None:
+            self.django_paginator_class = partial(
+                KnownCountPaginator, count=self.known_count
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def paginate_uncounted(self, queryset, request):
+        """Страница по номеру без COUNT(*)."""
+        self.request = request
+        self.cursor_count = None
+        page_size = self.get_page_size(request)
+        page_number = request.query_params.get(self.page_query_param, 1)
+        try:
+            number = int(page_number)
+            if number < 1:
+                raise ValueError
+        except ValueError:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message="Неверный номер страницы."
+            ))
+        offset = (number - 1) * page_size
+        results = list(queryset[offset:offset + page_size + 1])
+        if not results and number > 1:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message="Страница пуста."
+            ))
+        url = request.build_absolute_uri()
+        self.next_link = None
+        if len(results) > page_size:
+            self.next_link = replace_query_param(
+                url, self.page_query_param, number + 1
+            )
+        self.previous_link = None
+        if number == 2:
+            self.previous_link = remove_query_param(
+                url, self.page_query_param
+            )
+        elif number > 2:
+            self.previous_link = replace_query_param(
+                url, self.page_query_param, number - 1
+            )
+        return results[:page_size]
+
+    async def apaginate_queryset(self, queryset, request):
+        """Постраничный режим для async-представлений: acount и
+        асинхронная выборка страницы вместо синхронного Paginator."""
+        page_size = self.get_page_size(request)
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = self.known_count
+        if paginator.count is None:
+            paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            ))
+        self.request = request
+        self.cursor_mode = False
+        return [obj async for obj in self.page.object_list]
+
+    def encode_cursor(self, recipe, reverse):
+        position = (
+            f"{int(reverse)}|{recipe.created.isoformat()}|{recipe.pk}"
+        )
+        token = base64.urlsafe_b64encode(position.encode()).decode()
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param, token
+        )
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            reverse, created, pk = base64.urlsafe_b64decode(
+                token.encode()
+            ).decode().split("|")
+            return reverse == "1", datetime.fromisoformat(created), int(pk)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_cursor(self, queryset, request):
+        self.request = request
+        page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        queryset = queryset.order_by(*self.cursor_ordering)
+        count_mode = self.get_count_mode(request, "none")
+        self.cursor_count = None
+        if count_mode == "exact":
+            self.cursor_count = self.known_count
+            if self.cursor_count is None:
+                self.cursor_count = queryset.count()
+        elif count_mode == "approx":
+            self.cursor_count = approximate_count(queryset)
+        reverse = False
+        if cursor is not None:
+            reverse, created, pk = cursor
+            if reverse:
+                queryset = queryset.filter(
+                    Q(created__gt=created) | Q(created=created, id__gt=pk)
+                ).order_by("created", "id")
+            else:
+                queryset = queryset.filter(
+                    Q(created__lt=created) | Q(created=created, id__lt=pk)
+                )
+        results = list(queryset[:page_size + 1])
+        has_more = len(results) > page_size
+        results = results[:page_size]
+        if reverse:
+            results.reverse()
+        has_next = has_more if not reverse else cursor is not None
+        has_previous = has_more if reverse else cursor is not None
+        self.next_link = (
+            self.encode_cursor(results[-1], reverse=False)
+            if results and has_next else None
+        )
+        self.previous_link = (
+            self.encode_cursor(results[0], reverse=True)
+            if results and has_previous else None
+        )
+        return results
+
+    def get_paginated_response(self, data):
+        if not (self.cursor_mode or self.uncounted):
+            return super().get_paginated_response(data)
+        response = {"next": self.next_link, "previous": self.previous_link}
+        if self.cursor_count is not None:
+            response["count"] = self.cursor_count
+        response["results"] = data
+        return Response(response)
+
+
+class PopularPagination(CustomPagination):
+    """Постраничная пагинация без курсорного режима: порядок задан
+    рейтингом, а не датой публикации."""
+
+    cursor_query_param = None
+
+
+class TimelinePagination(CustomPagination):
+    """Лента подписок листается только курсором."""
+
+    cursor_only = True
@@ -0,0 +1,54 @@
+import json
+
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import BaseRenderer
+
+
+class ShoppingListRenderer(BaseRenderer):
+    """Формат выгрузки списка покупок.
+
+    Сам файл отдаётся потоком в обход рендерера,
+    через него выводятся только ответы с ошибками.
+    """
+
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return json.dumps(data, ensure_ascii=False).encode(self.charset)
+
+
+class TxtShoppingListRenderer(ShoppingListRenderer):
+
+    media_type = "text/plain"
+    format = "txt"
+
+
+class CsvShoppingListRenderer(ShoppingListRenderer):
+
+    media_type = "text/csv"
+    format = "csv"
+
+
+class PdfShoppingListRenderer(ShoppingListRenderer):
+
+    media_type = "application/pdf"
+    format = "pdf"
+    charset = None
+
+
+class ShoppingListNegotiation(DefaultContentNegotiation):
+    """Формат выгрузки задаётся только ?format=, по умолчанию txt.
+
+    Заголовок Accept не учитывается: фронтенд шлёт
+    Accept: application/json и ждёт файл.
+    """
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        format_query = format_suffix or request.query_params.get(
+            self.settings.URL_FORMAT_OVERRIDE
+        )
+        if format_query:
+            renderers = self.filter_renderers(renderers, format_query)
+        return renderers[0], renderers[0].media_type
@@ -0,0 +1,134 @@
+import bisect
+import heapq
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connections
+from django.db.models import Case, IntegerField, Q, Value, When
+
+from recipes.models import Ingredient
+from .cache import ingredients_cache
+
+TRIGRAM_THRESHOLD = 0.3
+TRIGRAM_MIN_LENGTH = 3
+
+
+def trigrams(text):
+    """Триграммы слов строки, как их считает pg_trgm."""
+    result = set()
+    for word in text.lower().split():
+        padded = f"  {word} "
+        result.update(
+            padded[position:position + 3]
+            for position in range(len(padded) - 2)
+        )
+    return result
+
+
+class IngredientSearchIndex:
+    """Индекс каталога ингредиентов в памяти процесса.
+
+    Нужен, когда база не PostgreSQL (например, SQLite в тестах):
+    сортированный список названий для поиска по префиксу
+    и триграммы для поиска с опечатками. Пересобирается
+    при смене версии справочника ингредиентов.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._expires = 0
+        self._data = None
+
+    def _load(self):
+        version, now = ingredients_cache.version(), time.monotonic()
+        with self._lock:
+            if (self._data is None or self._version != version
+                    or self._expires < now):
+                rows = sorted(
+                    (name.lower(), pk) for pk, name
+                    in Ingredient.objects.values_list("id", "name")
+                )
+                names = [name for name, _ in rows]
+                grams = {}
+                sizes = []
+                for position, name in enumerate(names):
+                    name_grams = trigrams(name)
+                    sizes.append(len(name_grams))
+                    for gram in name_grams:
+                        grams.setdefault(gram, []).append(position)
+                self._data = (names, [pk for _, pk in rows], grams, sizes)
+                self._version = version
+                self._expires = now + settings.REFERENCE_CACHE_TIMEOUT
+            return self._data
+
+    def search(self, query, limit):
+        """id ингредиентов: сначала префикс, затем подстрока, затем похожие."""
+        names, ids, grams, sizes = self._load()
+        query = query.lower()
+        found = []
+        start = bisect.bisect_left(names, query)
+        for position in range(start, len(names)):
+            if len(found) >= limit or not names[position].startswith(query):
+                break
+            found.append(position)
+        if len(found) < limit:
+            prefixed = set(found)
+            found.extend(heapq.nsmallest(
+                limit - len(found),
+                (
+                    position for position, name in enumerate(names)
+                    if query in name and position not in prefixed
+                ),
+                key=lambda position: (names[position].find(query),
+                                      names[position]),
+            ))
+        if len(found) < limit and len(query) >= TRIGRAM_MIN_LENGTH:
+            query_grams = trigrams(query)
+            shared = Counter(
+                position for gram in query_grams
+                for position in grams.get(gram, ())
+            )
+            matched = set(found)
+            similar = []
+            for position, common in shared.items():
+                if position in matched:
+                    continue
+                similarity = common / (
+                    len(query_grams) + sizes[position] - common
+                )
+                if similarity >= TRIGRAM_THRESHOLD:
+                    similar.append((-similarity, names[position], position))
+            found.extend(
+                position for _, _, position
+                in sorted(similar)[:limit - len(found)]
+            )
+        return [ids[position] for position in found]
+
+
+ingredient_index = IngredientSearchIndex()
+
+
+def search_ingredients(queryset, query, limit):
+    """Поиск ингредиентов по названию с ранжированием по релевантности."""
+    if connections[queryset.db].vendor == "postgresql":
+        return queryset.filter(
+            Q(name__icontains=query) | Q(name__trigram_similar=query)
+        ).annotate(
+            search_rank=Case(
+                When(name__istartswith=query, then=Value(0)),
+                When(name__icontains=query, then=Value(1)),
+                default=Value(2),
+                output_field=IntegerField(),
+            ),
+            similarity=TrigramSimilarity("name", query),
+        ).order_by("search_rank", "-similarity", "name")[:limit]
+    ids = ingredient_index.search(query, limit)
+    return queryset.filter(pk__in=ids).order_by(Case(
+        *(When(pk=pk, then=Value(position))
+          for position, pk in enumerate(ids)),
+        output_field=IntegerField(),
+    ))
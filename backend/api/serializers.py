@@ -1,19 +1,30 @@
 import base64
+import binascii
+import tempfile
 
-from django.core.files.base import ContentFile
+from django.conf import settings
+from django.core.files.base import File
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
 from djoser.serializers import UserCreateSerializer, UserSerializer
 from rest_framework import status, serializers
 from rest_framework.exceptions import ValidationError
-from rest_framework.fields import IntegerField, SerializerMethodField
-from rest_framework.relations import PrimaryKeyRelatedField
-from rest_framework.serializers import (ImageField, ModelSerializer,
+from rest_framework.fields import (IntegerField, ListField,
+                                   SerializerMethodField)
+from rest_framework.relations import (MANY_RELATION_KWARGS, ManyRelatedField,
+                                      PrimaryKeyRelatedField)
+from rest_framework.serializers import (ImageField, ListSerializer,
+                                        ModelSerializer,
                                         ReadOnlyField)
 
 from recipes.models import (
     Ingredient, IngredientInRecipe, Recipe, Tag
 )
+from recipes.timeline import fan_out
 from users.models import Fallow, UserFoodgram
+from .cache import get_ingredients, get_tags_by_ids
+from .images import schedule_renditions
+from .utils import CartTotalsService
 
 
 class WriteUserFoodgramCreateSerializer(UserCreateSerializer):
@@ -39,7 +50,15 @@ class ReadUserFoodgramSerializer(UserSerializer):
             "is_subscribed",
         )
 
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.context.get("omit_user_fields"):
+            fields.pop("is_subscribed")
+        return fields
+
     def get_is_subscribed(self, author):
+        if hasattr(author, "is_subscribed"):
+            return author.is_subscribed
         user = self.context.get("request").user
         if user.is_anonymous:
             return False
@@ -50,16 +69,122 @@ class ReadUserFoodgramSerializer(UserSerializer):
         return super().to_representation(instance)
 
 
+def absolute_url(request, url):
+    if request is not None:
+        return request.build_absolute_uri(url)
+    return url
+
+
 class Base64ImageField(ImageField):
+    """Изображение в base64.
+
+    Декодируется частями во временный файл, который уходит на диск,
+    если превышает IMAGE_SPOOL_SIZE. Если задан rendition, отдаёт
+    адрес уменьшенной копии, когда она уже готова.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, rendition=None, **kwargs):
+        self.rendition = rendition
+        super().__init__(**kwargs)
+
+    def decode(self, encoded, name):
+        buffer = tempfile.SpooledTemporaryFile(
+            max_size=settings.IMAGE_SPOOL_SIZE
+        )
+        try:
+            for start in range(0, len(encoded), self.CHUNK_SIZE):
+                buffer.write(base64.b64decode(
+                    encoded[start:start + self.CHUNK_SIZE], validate=True
+                ))
+        except binascii.Error:
+            buffer.close()
+            self.fail("invalid_image")
+        buffer.seek(0)
+        return File(buffer, name=name)
 
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith("data:image"):
-            format_value, imgstr = data.split(";base64,")
-            ext = format_value.split("/")[-1]
-            data = ContentFile(base64.b64decode(imgstr), name="photo." + ext)
+            header, separator, imgstr = data.partition(";base64,")
+            ext = header.partition("/")[2]
+            if not separator or not ext.isalnum():
+                self.fail("invalid_image")
+            data = self.decode(imgstr, "photo." + ext)
 
         return super().to_internal_value(data)
 
+    def to_representation(self, value):
+        path = None
+        if value and self.rendition:
+            path = value.instance.image_renditions.get(self.rendition)
+        if not path:
+            return super().to_representation(value)
+        return absolute_url(
+            self.context.get("request"), value.storage.url(path)
+        )
+
+
+class CachedPrimaryKeyRelatedField(PrimaryKeyRelatedField):
+    """Связь по id, объекты берутся из кеша справочника.
+
+    prefetched — объекты, заранее загруженные списком одним запросом.
+    """
+
+    def __init__(self, lookup, **kwargs):
+        self.lookup = lookup
+        self.prefetched = None
+        super().__init__(**kwargs)
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {"child_relation": cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+    def to_pk(self, data):
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            return int(data)
+        except (TypeError, ValueError):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+
+    def missing_error(self, missing):
+        """Одна ошибка со всеми несуществующими id."""
+        return ValidationError([
+            self.error_messages["does_not_exist"].format(pk_value=pk)
+            for pk in missing
+        ])
+
+    def to_internal_value(self, data):
+        pk = self.to_pk(data)
+        found = self.prefetched
+        if found is None:
+            found = self.lookup([pk])
+        obj = found.get(pk)
+        if obj is None:
+            self.fail("does_not_exist", pk_value=data)
+        return obj
+
+
+class BulkManyRelatedField(ManyRelatedField):
+    """Список id, проверяемый одним запросом для всех элементов."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, "__iter__"):
+            self.fail("not_a_list", input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail("empty")
+        pks = [self.child_relation.to_pk(item) for item in data]
+        found = self.child_relation.lookup(pks)
+        missing = [pk for pk in dict.fromkeys(pks) if pk not in found]
+        if missing:
+            raise self.child_relation.missing_error(missing)
+        return [found[pk] for pk in pks]
+
 
 class TagSerializer(ModelSerializer):
 
@@ -77,9 +202,28 @@ class IngredientSerializer(ModelSerializer):
         fields = ("id", "name", "measurement_unit")
 
 
+class IngredientInRecipeListSerializer(ListSerializer):
+    """Загружает все ингредиенты списка одним запросом до проверки
+    отдельных элементов; ошибки остаются по элементам."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            id_field = self.child.fields["id"]
+            pks = []
+            for item in data:
+                if isinstance(item, dict) and "id" in item:
+                    try:
+                        pks.append(id_field.to_pk(item["id"]))
+                    except ValidationError:
+                        continue
+            id_field.prefetched = id_field.lookup(pks)
+        return super().to_internal_value(data)
+
+
 class IngredientInRecipeWriteSerializer(ModelSerializer):
 
-    id = PrimaryKeyRelatedField(
+    id = CachedPrimaryKeyRelatedField(
+        lookup=get_ingredients,
         queryset=Ingredient.objects.all(),
     )
 
@@ -88,6 +232,7 @@ class IngredientInRecipeWriteSerializer(ModelSerializer):
         fields = (
             "id", "amount",
         )
+        list_serializer_class = IngredientInRecipeListSerializer
 
     def validate_amount(self, value):
         if value <= 0:
@@ -121,7 +266,8 @@ class ReadRecipeSerializer(ModelSerializer):
         read_only=True,
         source="ingridients_recipe"
     )
-    image = Base64ImageField()
+    image = Base64ImageField(rendition="card")
+    images = SerializerMethodField(read_only=True)
     is_favorited = SerializerMethodField(read_only=True)
     is_in_shopping_cart = SerializerMethodField(read_only=True)
 
@@ -136,26 +282,57 @@ class ReadRecipeSerializer(ModelSerializer):
             "is_in_shopping_cart",
             "name",
             "image",
+            "images",
             "text",
             "cooking_time",
         )
 
+    def get_fields(self):
+        fields = super().get_fields()
+        if self.context.get("omit_user_fields"):
+            fields.pop("is_favorited")
+            fields.pop("is_in_shopping_cart")
+        return fields
+
+    def get_images(self, recipe):
+        """Адреса оригинала и готовых уменьшенных копий."""
+        if not recipe.image:
+            return {}
+        paths = {"original": recipe.image.name, **recipe.image_renditions}
+        return {
+            name: absolute_url(
+                self.context.get("request"), recipe.image.storage.url(path)
+            )
+            for name, path in paths.items()
+        }
+
     def get_is_favorited(self, recipe):
+        if hasattr(recipe, "is_favorited"):
+            return recipe.is_favorited
         user = self.context.get("request").user
         if user.is_anonymous:
             return False
         return user.favorited.filter(recipe=recipe).exists()
 
     def get_is_in_shopping_cart(self, recipe):
+        if hasattr(recipe, "is_in_shopping_cart"):
+            return recipe.is_in_shopping_cart
         user = self.context.get("request").user
         if user.is_anonymous:
             return False
         return user.shop_carts_users.filter(recipe=recipe).exists()
 
+    def to_representation(self, recipe):
+        if hasattr(recipe, "author_is_subscribed"):
+            recipe.author.is_subscribed = recipe.author_is_subscribed
+        return super().to_representation(recipe)
+
 
 class RecipeWriteSerializer(ModelSerializer):
 
-    tags = PrimaryKeyRelatedField(queryset=Tag.objects.all(), many=True)
+    tags = CachedPrimaryKeyRelatedField(
+        lookup=get_tags_by_ids, queryset=Tag.objects.all(), many=True
+    )
     ingredients = IngredientInRecipeWriteSerializer(many=True, required=True)
     image = Base64ImageField()
     cooking_time = IntegerField()
@@ -213,21 +390,68 @@ class RecipeWriteSerializer(ModelSerializer):
             tag_ids.add(tag_id)
         return tags
 
-    def create_ingredients(self, ingredients, recipe):
-        ingredient_create = []
+    @staticmethod
+    def ingredient_amounts(ingredients):
+        """{ingredient_id: amount} из проверенных данных."""
+        amounts = {}
         for ingredient in ingredients:
             ingredient_obj = ingredient["id"]
             ingredient_id = ingredient_obj.id if isinstance(
                 ingredient_obj, Ingredient) else ingredient_obj
-            ingredient_amount = ingredient["amount"]
-            ingredient_create.append(
-                IngredientInRecipe(
-                    ingredient_id=ingredient_id,
-                    amount=ingredient_amount,
-                    recipe=recipe
-                )
+            amounts[ingredient_id] = ingredient["amount"]
+        return amounts
+
+    def create_ingredients(self, ingredients, recipe):
+        IngredientInRecipe.objects.bulk_create(
+            IngredientInRecipe(
+                ingredient_id=ingredient_id,
+                amount=amount,
+                recipe=recipe
+            )
+            for ingredient_id, amount
+            in self.ingredient_amounts(ingredients).items()
+        )
+
+    def update_ingredients(self, ingredients, recipe):
+        """Меняет только отличающиеся строки состава рецепта.
+
+        Возвращает старый и новый состав оставшихся и добавленных строк
+        для пересчёта корзин: bulk-операции не отправляют сигналы,
+        а удалённые строки вычитаются из корзин сигналом pre_delete.
+        """
+        existing = {
+            row.ingredient_id: row
+            for row in IngredientInRecipe.objects.filter(recipe=recipe)
+        }
+        new_amounts = self.ingredient_amounts(ingredients)
+        old_amounts = {
+            ingredient_id: row.amount
+            for ingredient_id, row in existing.items()
+            if ingredient_id in new_amounts
+        }
+        removed = existing.keys() - new_amounts.keys()
+        if removed:
+            IngredientInRecipe.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id, amount in new_amounts.items():
+            row = existing.get(ingredient_id)
+            if row is not None and row.amount != amount:
+                row.amount = amount
+                changed.append(row)
+        if changed:
+            IngredientInRecipe.objects.bulk_update(changed, ["amount"])
+        added = [
+            IngredientInRecipe(
+                ingredient_id=ingredient_id, amount=amount, recipe=recipe
             )
-        IngredientInRecipe.objects.bulk_create(ingredient_create)
+            for ingredient_id, amount in new_amounts.items()
+            if ingredient_id not in existing
+        ]
+        if added:
+            IngredientInRecipe.objects.bulk_create(added)
+        return old_amounts, new_amounts
 
     def create(self, validated_data):
         ingredients = validated_data.pop("ingredients")
@@ -237,26 +461,46 @@ class RecipeWriteSerializer(ModelSerializer):
         recipe.save()
         self.create_ingredients(ingredients, recipe)
         recipe.tags.set(tags)
+        fan_out(recipe)
+        if recipe.image:
+            schedule_renditions(recipe.id)
         return recipe
 
     @transaction.atomic
     def update(self, instance, validated_data):
         tags = validated_data.pop("tags")
         ingredients = validated_data.pop("ingredients")
+        obsolete = []
+        if "image" in validated_data:
+            obsolete = instance.image_renditions.values()
+            validated_data["image_renditions"] = {}
         instance = super().update(instance, validated_data)
-        instance.ingredients.clear()
-        instance.tags.clear()
+        if "image" in validated_data:
+            schedule_renditions(instance.id, obsolete)
         instance.tags.set(tags)
-        self.create_ingredients(ingredients=ingredients, recipe=instance)
+        old_amounts, new_amounts = self.update_ingredients(
+            ingredients=ingredients, recipe=instance
+        )
+        CartTotalsService.change_recipe(instance.id, old_amounts, new_amounts)
         return instance
 
     def to_representation(self, instance):
+        prefetch_related_objects(
+            [instance],
+            "tags",
+            Prefetch(
+                "ingridients_recipe",
+                queryset=IngredientInRecipe.objects.select_related(
+                    "ingredient"
+                ),
+            ),
+        )
         return ReadRecipeSerializer(instance, context=self.context).data
 
 
 class RecipeShortSerializer(ModelSerializer):
 
-    image = Base64ImageField()
+    image = Base64ImageField(rendition="thumbnail")
 
     class Meta:
         model = Recipe
@@ -268,6 +512,19 @@ class RecipeShortSerializer(ModelSerializer):
         )
 
 
+class BulkRecipesSerializer(serializers.Serializer):
+    """Список id рецептов для пакетного добавления или удаления."""
+
+    recipes = ListField(
+        child=IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=settings.BULK_RECIPES_MAX,
+    )
+
+    def validate_recipes(self, value):
+        return list(dict.fromkeys(value))
+
+
 class SubscribeFoodgramSerializer(ReadUserFoodgramSerializer):
 
     recipes_count = IntegerField(
@@ -321,11 +578,6 @@ class FallowFoodgramSerializer(ReadUserFoodgramSerializer):
     def validate(self, data):
         writer = self.instance
         user = self.context.get("request").user
-        if Fallow.objects.filter(author=writer, user=user).exists():
-            raise ValidationError(
-                detail="Вы уже подписаны на этого пользователя!",
-                code=status.HTTP_400_BAD_REQUEST
-            )
         if user == writer:
             raise ValidationError(
                 detail="Нельзя подписаться на самого себя!",
@@ -333,15 +585,26 @@ class FallowFoodgramSerializer(ReadUserFoodgramSerializer):
             )
         return data
 
+    @staticmethod
+    def get_recipes_limit(request):
+        """recipes_limit из запроса или None, если не задан или неверен."""
+        try:
+            limit = int(request.GET.get("recipes_limit"))
+        except (TypeError, ValueError):
+            return None
+        return limit if limit >= 0 else None
+
     @staticmethod
     def get_recipes_count(author):
-        return author.recipes.count()
+        return author.recipes_count
 
     def get_recipes(self, author):
-        request = self.context.get("request")
-        limit = request.GET.get("recipes_limit")
-        recipes = author.recipes.all()
-        if limit:
-            recipes = recipes[:int(limit)]
+        if hasattr(author, "limited_recipes"):
+            recipes = author.limited_recipes
+        else:
+            limit = self.get_recipes_limit(self.context.get("request"))
+            recipes = author.recipes.all()
+            if limit is not None:
+                recipes = recipes[:limit]
         serializer = RecipeShortSerializer(recipes, many=True, read_only=True)
         return serializer.data
@@ -0,0 +1,138 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from recipes.models import (Ingredient, IngredientInRecipe, Recipe, ShopCart,
+                            Tag)
+from users.models import Fallow
+from .cache import ingredients_cache, subscriptions_cache, tags_cache
+from .utils import CartTotalsService
+
+# Кеши сбрасываются после коммита: иначе другой запрос успеет
+# заполнить их ещё не изменёнными данными, а при откате сброс
+# окажется напрасным.
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def bump_ingredients_version(using, **kwargs):
+    transaction.on_commit(ingredients_cache.bump, using=using)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def bump_tags_version(using, **kwargs):
+    transaction.on_commit(tags_cache.bump, using=using)
+
+
+@receiver((post_save, post_delete), sender=Fallow)
+def invalidate_subscriptions(instance, using, **kwargs):
+    transaction.on_commit(
+        partial(subscriptions_cache.invalidate_user, instance.user_id),
+        using=using,
+    )
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def invalidate_author_subscribers(instance, using, **kwargs):
+    transaction.on_commit(
+        partial(subscriptions_cache.invalidate_author, instance.author_id),
+        using=using,
+    )
+
+
+def deleted_directly(sender, origin):
+    """Строка удалена сама, а не каскадом от рецепта, пользователя
+    или ингредиента: каскады учитываются в итогах корзин отдельно."""
+    return origin is None or isinstance(origin, sender) or (
+        getattr(origin, "model", None) is sender
+    )
+
+
+def deleted_rows(instance, origin):
+    """Все удаляемые строки при первом сигнале удаления queryset
+    и ничего при следующих, чтобы итоги менялись пачкой."""
+    if not isinstance(origin, QuerySet):
+        return [instance]
+    if getattr(origin, "_cart_totals_applied", False):
+        return []
+    origin._cart_totals_applied = True
+    return list(origin)
+
+
+@receiver(pre_save, sender=ShopCart)
+@receiver(pre_save, sender=IngredientInRecipe)
+def remember_previous_row(sender, instance, raw=False, **kwargs):
+    """Прежняя версия изменяемой строки, например из админки."""
+    instance._previous = None
+    if not raw and not instance._state.adding:
+        instance._previous = sender.objects.filter(pk=instance.pk).first()
+
+
+@receiver(post_save, sender=ShopCart)
+def add_to_cart_totals(instance, created, **kwargs):
+    previous = getattr(instance, "_previous", None)
+    if previous is not None:
+        if (previous.user_id, previous.recipe_id) == (
+            instance.user_id, instance.recipe_id
+        ):
+            return
+        CartTotalsService.remove_recipe(previous.user_id, previous.recipe_id)
+    elif not created:
+        return
+    CartTotalsService.add_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShopCart)
+def remove_from_cart_totals(sender, instance, origin=None, **kwargs):
+    if not deleted_directly(sender, origin):
+        return
+    removed = {}
+    for row in deleted_rows(instance, origin):
+        removed.setdefault(row.user_id, []).append(row.recipe_id)
+    for user_id, recipe_ids in removed.items():
+        CartTotalsService.remove_recipes(user_id, recipe_ids)
+
+
+@receiver(post_save, sender=IngredientInRecipe)
+def change_cart_totals(instance, created, **kwargs):
+    previous = getattr(instance, "_previous", None)
+    old_amounts = {}
+    if previous is not None:
+        old_amounts = {previous.ingredient_id: previous.amount}
+        if previous.recipe_id != instance.recipe_id:
+            CartTotalsService.change_recipe(
+                previous.recipe_id, old_amounts, {}
+            )
+            old_amounts = {}
+    elif not created:
+        return
+    CartTotalsService.change_recipe(
+        instance.recipe_id, old_amounts,
+        {instance.ingredient_id: instance.amount},
+    )
+
+
+@receiver(pre_delete, sender=IngredientInRecipe)
+def remove_ingredients_from_cart_totals(sender, instance, origin=None,
+                                        **kwargs):
+    if not deleted_directly(sender, origin):
+        return
+    removed = {}
+    for row in deleted_rows(instance, origin):
+        removed.setdefault(row.recipe_id, {})[row.ingredient_id] = row.amount
+    for recipe_id, amounts in removed.items():
+        CartTotalsService.change_recipe(recipe_id, amounts, {})
+
+
+@receiver(pre_delete, sender=Recipe)
+def remove_recipe_from_cart_totals(instance, **kwargs):
+    """До каскада, пока состав рецепта ещё в базе."""
+    CartTotalsService.remove_recipe_for_users(
+        ShopCart.objects.filter(
+            recipe=instance
+        ).values_list("user_id", flat=True),
+        instance.id,
+    )
@@ -0,0 +1,123 @@
+import base64
+import re
+from io import BytesIO
+
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.test import TestCase
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.cache import ingredients_cache, tags_cache
+from recipes.models import Ingredient, IngredientInRecipe, Recipe, Tag
+from users.models import UserFoodgram
+
+
+def reset_caches():
+    tags_cache.bump()
+    ingredients_cache.bump()
+    caches["default"].clear()
+
+
+def create_user(username, **kwargs):
+    return UserFoodgram.objects.create_user(
+        username=username, email=f"{username}@foodgram.test",
+        password="password", first_name=username, last_name=username,
+        **kwargs,
+    )
+
+
+def auth_client(user, **kwargs):
+    """Клиент с заголовком Authorization: Token, как у фронтенда."""
+    client = APIClient(**kwargs)
+    token, _ = Token.objects.get_or_create(user=user)
+    client.credentials(HTTP_AUTHORIZATION=f"Token {token.key}")
+    return client
+
+
+def create_tags(count):
+    return [
+        Tag.objects.create(
+            name=f"Тег {number}", slug=f"tag-{number}",
+            color=f"#{number:06d}",
+        )
+        for number in range(count)
+    ]
+
+
+def create_ingredients(count):
+    return Ingredient.objects.bulk_create(
+        Ingredient(name=f"Ингредиент {number}", measurement_unit="г")
+        for number in range(count)
+    )
+
+
+def create_recipe(author, tags=(), ingredients=(), name="Рецепт"):
+    recipe = Recipe.objects.create(author=author, name=name, text="Текст")
+    recipe.tags.set(tags)
+    IngredientInRecipe.objects.bulk_create(
+        IngredientInRecipe(recipe=recipe, ingredient=ingredient, amount=10)
+        for ingredient in ingredients
+    )
+    return recipe
+
+
+def image_data_uri():
+    buffer = BytesIO()
+    Image.new("RGB", (2, 2)).save(buffer, "PNG")
+    return "data:image/png;base64," + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+INDEX_SCAN = re.compile(
+    r"Index (?:Only )?Scan (?:Backward )?using (\w+)"
+    r"|Bitmap Index Scan on (\w+)"
+)
+
+
+def index_names(model):
+    """Имена индексов таблицы модели, включая уникальные."""
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(
+            cursor, model._meta.db_table
+        )
+    return {
+        name for name, info in constraints.items()
+        if info["index"] or info["unique"]
+    }
+
+
+def explain(queryset):
+    """План PostgreSQL с запретом полного сканирования.
+
+    На маленьких тестовых таблицах планировщик выбирает Seq Scan
+    даже при подходящем индексе, поэтому проверяется, что индекс
+    вообще может быть использован.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        return queryset.explain()
+
+
+def used_indexes(plan):
+    return {next(filter(None, match)) for match in INDEX_SCAN.findall(plan)}
+
+
+class APITestCase(TestCase):
+    """Пользователь, автор и клиенты для них.
+
+    Кеши справочников и подписок переживают откат транзакции теста,
+    поэтому сбрасываются перед каждым тестом.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user("user")
+        cls.author = create_user("author")
+
+    def setUp(self):
+        reset_caches()
+        self.guest = APIClient()
+        self.client = auth_client(self.user)
@@ -0,0 +1,60 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from api.metrics import assert_max_queries
+from recipes.models import (Favorites, Ingredient, IngredientInRecipe, Recipe,
+                            ShopCart, Tag, TagInRecipe)
+from users.models import Fallow, UserFoodgram
+from .base import create_ingredients, create_recipe, create_tags, create_user
+
+CHANGELISTS = (
+    Recipe, Ingredient, Tag, ShopCart, Favorites, IngredientInRecipe,
+    TagInRecipe, Fallow, UserFoodgram,
+)
+# Сессия, пользователь, COUNT, строки страницы и фильтры.
+CHANGELIST_QUERIES = 5
+
+
+@override_settings(
+    PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"]
+)
+class AdminChangelistQueriesTest(TestCase):
+    """Страница списка в админке выполняет ограниченное число запросов,
+    не зависящее от числа строк."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = create_user("admin", is_staff=True, is_superuser=True)
+        cls.tags = create_tags(3)
+        cls.ingredients = create_ingredients(5)
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def populate(self, first, count):
+        for number in range(first, first + count):
+            user = create_user(f"user{number}")
+            recipe = create_recipe(
+                user, self.tags, self.ingredients, f"Рецепт {number}"
+            )
+            Favorites.objects.create(user=self.admin, recipe=recipe)
+            ShopCart.objects.create(user=self.admin, recipe=recipe)
+            Fallow.objects.create(user=self.admin, author=user)
+
+    def changelist_queries(self):
+        counts = {}
+        for model in CHANGELISTS:
+            opts = model._meta
+            url = reverse(f"admin:{opts.app_label}_{opts.model_name}"
+                          "_changelist")
+            with assert_max_queries(CHANGELIST_QUERIES) as counter:
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            counts[opts.model_name] = counter.count
+        return counts
+
+    def test_changelist_queries_do_not_depend_on_rows(self):
+        self.populate(0, 2)
+        few = self.changelist_queries()
+        self.populate(2, 20)
+        self.assertEqual(self.changelist_queries(), few)
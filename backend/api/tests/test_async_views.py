@@ -0,0 +1,79 @@
+import shutil
+import tempfile
+from importlib import import_module, reload
+
+from django.test import override_settings
+from django.urls import clear_url_caches, resolve
+
+from recipes.models import Recipe
+from .base import (APITestCase, auth_client, create_ingredients, create_tags,
+                   image_data_uri)
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def reload_urls():
+    """Маршруты api/urls.py выбираются по ASYNC_VIEWS при импорте."""
+    clear_url_caches()
+    reload(import_module("api.urls"))
+    reload(import_module("backend.urls"))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class AsyncRecipeWriteTest(APITestCase):
+    """С ASYNC_VIEWS запись рецептов по токену не упирается в CSRF,
+    как и у представлений DRF."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.tags = create_tags(2)
+        cls.ingredients = create_ingredients(2)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        super().setUp()
+        self.addCleanup(reload_urls)
+        async_views = override_settings(ASYNC_VIEWS=True)
+        async_views.enable()
+        self.addCleanup(async_views.disable)
+        reload_urls()
+        self.client = auth_client(self.user, enforce_csrf_checks=True)
+
+    def payload(self, name):
+        return {
+            "name": name,
+            "text": "Текст",
+            "cooking_time": 10,
+            "image": image_data_uri(),
+            "tags": [tag.id for tag in self.tags],
+            "ingredients": [
+                {"id": ingredient.id, "amount": 5}
+                for ingredient in self.ingredients
+            ],
+        }
+
+    def test_create_update_delete(self):
+        self.assertEqual(
+            resolve("/api/recipes/").url_name, "recipes-list-async"
+        )
+        response = self.client.post(
+            "/api/recipes/", self.payload("Рецепт"), format="json"
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        url = f"/api/recipes/{response.json()['id']}/"
+        self.assertEqual(resolve(url).url_name, "recipes-detail-async")
+
+        response = self.client.patch(
+            url, self.payload("Новый рецепт"), format="json"
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()["name"], "Новый рецепт")
+
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, 204, response.content)
+        self.assertFalse(Recipe.objects.exists())
@@ -0,0 +1,87 @@
+from api.metrics import assert_max_queries
+from api.utils import CartTotalsService
+from recipes.models import Favorites, Recipe, RecipePopularity, ShopCart
+from .base import APITestCase, create_ingredients, create_recipe
+
+MISSING = 10 ** 6
+
+
+class BulkTargetTest(APITestCase):
+    """Пакетные избранное и корзина: статус по каждому рецепту,
+    побочные эффекты только для реально добавленных или удалённых
+    строк и число запросов, не зависящее от размера пачки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        ingredients = create_ingredients(3)
+        cls.recipes = [
+            create_recipe(cls.author, ingredients=ingredients)
+            for _ in range(12)
+        ]
+        cls.ids = [recipe.id for recipe in cls.recipes]
+
+    def send(self, method, target, ids):
+        with assert_max_queries() as counter:
+            response = getattr(self.client, method)(
+                f"/api/recipes/{target}/bulk/", {"recipes": ids},
+                format="json",
+            )
+        self.assertEqual(response.status_code, 200, response.data)
+        return {
+            item["id"]: item["status"] for item in response.data["results"]
+        }, counter.count
+
+    def counters(self, field):
+        return dict(Recipe.objects.values_list("id", field))
+
+    def test_add_and_remove_favorites(self):
+        statuses, _ = self.send("post", "favorite", self.ids[:2] + [MISSING])
+        self.assertEqual(statuses, {
+            self.ids[0]: "added", self.ids[1]: "added", MISSING: "not_found",
+        })
+        statuses, _ = self.send("post", "favorite", self.ids[1:3])
+        self.assertEqual(
+            statuses, {self.ids[1]: "exists", self.ids[2]: "added"}
+        )
+        counters = self.counters("favorites_count")
+        self.assertEqual([counters[pk] for pk in self.ids[:4]], [1, 1, 1, 0])
+        self.assertEqual(
+            set(RecipePopularity.objects.filter(
+                dirty=True
+            ).values_list("recipe_id", flat=True)),
+            set(self.ids[:3]),
+        )
+
+        statuses, _ = self.send(
+            "delete", "favorite", [self.ids[0], self.ids[3]]
+        )
+        self.assertEqual(
+            statuses, {self.ids[0]: "removed", self.ids[3]: "not_found"}
+        )
+        counters = self.counters("favorites_count")
+        self.assertEqual([counters[pk] for pk in self.ids[:4]], [0, 1, 1, 0])
+        self.assertEqual(
+            set(Favorites.objects.values_list("recipe_id", flat=True)),
+            set(self.ids[1:3]),
+        )
+
+    def test_shopping_cart_totals(self):
+        self.send("post", "shopping_cart", self.ids[:5])
+        self.send("post", "shopping_cart", self.ids[3:8])
+        self.assertEqual(ShopCart.objects.count(), 8)
+        self.assertEqual(CartTotalsService.drift([self.user.id]), {})
+        self.send("delete", "shopping_cart", self.ids[6:] + [MISSING])
+        self.assertEqual(ShopCart.objects.count(), 6)
+        self.assertEqual(CartTotalsService.drift([self.user.id]), {})
+        counters = self.counters("shopping_cart_count")
+        self.assertEqual(sum(counters.values()), 6)
+
+    def test_queries_do_not_depend_on_batch_size(self):
+        for method in ("post", "delete"):
+            with self.subTest(method=method):
+                counts = {
+                    self.send(method, "shopping_cart", ids)[1]
+                    for ids in (self.ids[:1], self.ids[1:12])
+                }
+                self.assertEqual(len(counts), 1, counts)
@@ -0,0 +1,33 @@
+from api.metrics import assert_max_queries
+from .base import (APITestCase, create_ingredients, create_tags,
+                   reset_caches)
+
+
+class CatalogueQueriesTest(APITestCase):
+    """Теги и ингредиенты укладываются в бюджет и при холодном кеше
+    справочников, с токеном и без."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.tag = create_tags(3)[0]
+        cls.ingredient = create_ingredients(5)[0]
+
+    def test_cold_cache_within_budget(self):
+        requests = (
+            ("/api/tags/", "TagsViewSet.list"),
+            (f"/api/tags/{self.tag.id}/", "TagsViewSet.retrieve"),
+            ("/api/ingredients/", "IngredientsViewSet.list"),
+            ("/api/ingredients/?name=Ингр", "IngredientsViewSet.list"),
+            (f"/api/ingredients/{self.ingredient.id}/",
+             "IngredientsViewSet.retrieve"),
+        )
+        for client in (self.guest, self.client):
+            for url, endpoint in requests:
+                with self.subTest(
+                    url=url, authenticated=client is self.client
+                ):
+                    reset_caches()
+                    with assert_max_queries(endpoint=endpoint):
+                        response = client.get(url)
+                    self.assertEqual(response.status_code, 200)
@@ -0,0 +1,117 @@
+import threading
+from collections import Counter
+
+from django.db import connection
+from django.test import TransactionTestCase, skipUnlessDBFeature
+
+from api.utils import CartTotalsService
+from recipes.models import Favorites, ShopCart
+from users.models import Fallow
+from .base import (auth_client, create_ingredients, create_recipe,
+                   create_user, reset_caches)
+
+PARALLEL = 8
+
+
+@skipUnlessDBFeature("test_db_allows_multiple_connections")
+class ParallelTogglesTest(TransactionTestCase):
+    """Одновременные добавления и удаления: ровно одно успешно,
+    остальные получают 400, а не 500, счётчики не расходятся.
+
+    Нужна база, к которой потоки подключаются одновременно,
+    тестовая SQLite в памяти этого не позволяет.
+    """
+
+    def setUp(self):
+        reset_caches()
+        self.user = create_user("user")
+        self.author = create_user("author")
+        self.recipe = create_recipe(
+            self.author, ingredients=create_ingredients(3)
+        )
+
+    def parallel(self, method, url, data=None):
+        """Статусы PARALLEL одинаковых запросов, стартующих вместе."""
+        barrier = threading.Barrier(PARALLEL)
+        statuses = Counter()
+        lock = threading.Lock()
+
+        def send(client):
+            try:
+                barrier.wait()
+                status_code = getattr(client, method)(
+                    url, data, format="json"
+                ).status_code
+                with lock:
+                    statuses[status_code] += 1
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=send, args=(auth_client(
+                self.user, raise_request_exception=False
+            ),))
+            for _ in range(PARALLEL)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def test_favorite(self):
+        url = f"/api/recipes/{self.recipe.id}/favorite/"
+        self.assertEqual(
+            self.parallel("post", url), {201: 1, 400: PARALLEL - 1}
+        )
+        self.assertEqual(Favorites.objects.count(), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 1)
+
+        self.assertEqual(
+            self.parallel("delete", url), {204: 1, 400: PARALLEL - 1}
+        )
+        self.assertFalse(Favorites.objects.exists())
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.favorites_count, 0)
+
+    def test_shopping_cart(self):
+        url = f"/api/recipes/{self.recipe.id}/shopping_cart/"
+        self.assertEqual(
+            self.parallel("post", url), {201: 1, 400: PARALLEL - 1}
+        )
+        self.assertEqual(ShopCart.objects.count(), 1)
+        self.assertEqual(CartTotalsService.drift([self.user.id]), {})
+
+        self.assertEqual(
+            self.parallel("delete", url), {204: 1, 400: PARALLEL - 1}
+        )
+        self.assertFalse(ShopCart.objects.exists())
+        self.assertEqual(CartTotalsService.drift([self.user.id]), {})
+
+    def test_bulk_shopping_cart(self):
+        url = "/api/recipes/shopping_cart/bulk/"
+        data = {"recipes": [self.recipe.id]}
+        self.assertEqual(self.parallel("post", url, data), {200: PARALLEL})
+        self.assertEqual(ShopCart.objects.count(), 1)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.shopping_cart_count, 1)
+        self.assertEqual(CartTotalsService.drift([self.user.id]), {})
+
+        self.assertEqual(self.parallel("delete", url, data), {200: PARALLEL})
+        self.assertFalse(ShopCart.objects.exists())
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.shopping_cart_count, 0)
+        self.assertEqual(CartTotalsService.drift([self.user.id]), {})
+
+    def test_subscribe(self):
+        url = f"/api/users/{self.author.id}/subscribe/"
+        self.assertEqual(
+            self.parallel("post", url), {201: 1, 400: PARALLEL - 1}
+        )
+        self.assertEqual(Fallow.objects.count(), 1)
+
+        self.assertEqual(
+            self.parallel("delete", url), {204: 1, 400: PARALLEL - 1}
+        )
+        self.assertFalse(Fallow.objects.exists())
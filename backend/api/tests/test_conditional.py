@@ -0,0 +1,80 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from api.metrics import assert_max_queries
+from recipes.models import Favorites, Recipe
+from .base import APITestCase, create_ingredients, create_recipe, create_tags
+
+SHARED_LIST = "/api/recipes/?user_fields=false"
+
+
+class RecipeValidatorsTest(APITestCase):
+    """Ответ 304 отдаётся до выборки и сериализации рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        tags = create_tags(2)
+        ingredients = create_ingredients(3)
+        cls.recipes = [
+            create_recipe(cls.author, tags, ingredients, f"Рецепт {number}")
+            for number in range(3)
+        ]
+
+    def revalidate(self, client, url, **headers):
+        with assert_max_queries() as counter:
+            response = client.get(url, **headers)
+        return response, counter.count
+
+    def test_list_not_modified_with_one_query(self):
+        response = self.guest.get(SHARED_LIST)
+        self.assertIn("Last-Modified", response)
+        response, count = self.revalidate(
+            self.guest, SHARED_LIST, HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(count, 1)
+
+    def test_list_if_modified_since(self):
+        last_modified = self.guest.get(SHARED_LIST)["Last-Modified"]
+        response, count = self.revalidate(
+            self.guest, SHARED_LIST, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(count, 1)
+
+        Recipe.objects.filter(pk=self.recipes[0].pk).update(
+            updated=timezone.now() + timedelta(minutes=1)
+        )
+        response = self.guest.get(
+            SHARED_LIST, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_etag_follows_user_state(self):
+        etag = self.client.get("/api/recipes/")["ETag"]
+        self.assertEqual(self.client.get(
+            "/api/recipes/", HTTP_IF_NONE_MATCH=etag
+        ).status_code, 304)
+        Favorites.objects.create(user=self.user, recipe=self.recipes[0])
+        response = self.client.get("/api/recipes/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("Last-Modified", response)
+
+    def test_list_etag_follows_deletions(self):
+        etag = self.guest.get(SHARED_LIST)["ETag"]
+        self.recipes[0].delete()
+        response = self.guest.get(SHARED_LIST, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["count"], 2)
+
+    def test_retrieve_not_modified_with_one_query(self):
+        url = f"/api/recipes/{self.recipes[0].pk}/?user_fields=false"
+        response = self.guest.get(url)
+        self.assertIn("Last-Modified", response)
+        response, count = self.revalidate(
+            self.guest, url, HTTP_IF_NONE_MATCH=response["ETag"]
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(count, 1)
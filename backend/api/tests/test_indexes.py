@@ -0,0 +1,115 @@
+from unittest import skipUnless
+
+from django.db import connection
+
+from api.utils import ShoppingCartService
+from api.views import CustomUserViewSet, RecipeViewSet
+from recipes.models import (Favorites, IngredientInRecipe, Recipe, ShopCart,
+                            ShopCartIngredient, TagInRecipe)
+from users.models import Fallow
+from .base import (APITestCase, create_ingredients, create_recipe,
+                   create_tags, explain, index_names, used_indexes)
+
+# Частые выборки: таблица и столбцы, с которых должен начинаться индекс.
+HOT_LOOKUPS = (
+    (Favorites, ["user_id", "recipe_id"]),
+    (ShopCart, ["user_id", "recipe_id"]),
+    (Fallow, ["user_id", "date_added"]),
+    (Fallow, ["user_id", "author_id"]),
+    (Recipe, ["author_id", "created"]),
+    (IngredientInRecipe, ["recipe_id", "ingredient_id"]),
+    (IngredientInRecipe, ["ingredient_id"]),
+    (TagInRecipe, ["tag_id", "recipe_id"]),
+    (TagInRecipe, ["recipe_id"]),
+    (ShopCartIngredient, ["user_id", "ingredient_id"]),
+)
+
+
+def indexed_columns(model):
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(
+            cursor, model._meta.db_table
+        )
+    return [
+        info["columns"] for info in constraints.values()
+        if info["index"] or info["unique"]
+    ]
+
+
+class HotRowsTestCase(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        tags = create_tags(2)
+        ingredients = create_ingredients(3)
+        cls.recipe = create_recipe(cls.author, tags, ingredients)
+        Favorites.objects.create(user=cls.user, recipe=cls.recipe)
+        ShopCart.objects.create(user=cls.user, recipe=cls.recipe)
+        Fallow.objects.create(user=cls.user, author=cls.author)
+
+
+class IndexesTest(HotRowsTestCase):
+    """Индексы после миграций покрывают частые выборки API."""
+
+    def test_recipe_tags_use_single_through_model(self):
+        self.assertIs(Recipe.tags.through, TagInRecipe)
+        self.assertEqual(
+            TagInRecipe.objects.filter(recipe=self.recipe).count(), 2
+        )
+
+    def test_hot_lookups_are_indexed(self):
+        for model, columns in HOT_LOOKUPS:
+            with self.subTest(model=model.__name__, columns=columns):
+                self.assertTrue(any(
+                    indexed[:len(columns)] == columns
+                    for indexed in indexed_columns(model)
+                ))
+
+
+@skipUnless(connection.vendor == "postgresql", "EXPLAIN PostgreSQL")
+class IndexScansTest(HotRowsTestCase):
+    """Запросы из api/views.py и api/filters.py читают таблицы
+    по индексам, а не полным сканированием."""
+
+    def assertUsesIndex(self, queryset, *models):
+        plan = explain(queryset)
+        for model in models:
+            with self.subTest(model=model.__name__):
+                self.assertTrue(
+                    used_indexes(plan) & index_names(model), plan
+                )
+
+    def test_user_flags(self):
+        self.assertUsesIndex(
+            RecipeViewSet.get_read_queryset(self.user),
+            Favorites, ShopCart, Fallow,
+        )
+
+    def test_recipes_by_author(self):
+        plan = explain(Recipe.objects.filter(author=self.author)[:6])
+        self.assertIn("recipe_author_created_idx", used_indexes(plan), plan)
+
+    def test_recipe_ingredients(self):
+        self.assertUsesIndex(
+            IngredientInRecipe.objects.filter(recipe=self.recipe),
+            IngredientInRecipe,
+        )
+        self.assertUsesIndex(
+            IngredientInRecipe.objects.filter(
+                ingredient=self.recipe.ingredients.first()
+            ),
+            IngredientInRecipe,
+        )
+
+    def test_subscriptions(self):
+        self.assertUsesIndex(
+            CustomUserViewSet.get_subscriptions_queryset(self.user, None),
+            Fallow,
+        )
+
+    def test_shopping_list(self):
+        self.assertUsesIndex(
+            ShoppingCartService.get_ingredients(self.user),
+            ShopCartIngredient,
+        )
@@ -0,0 +1,65 @@
+from unittest import mock
+
+from django.db import connection
+from django.test import TransactionTestCase
+
+from api.utils import CartTotalsService
+from recipes.models import (Ingredient, IngredientInRecipe, ShopCart,
+                            ShopCartIngredient)
+from recipes.signals import merge_duplicate_ingredients
+from .base import create_recipe, create_user
+
+
+class MergeDuplicateIngredientsTest(TransactionTestCase):
+    """Дубликаты ингредиентов, созданные до unique_ingredient,
+    сливаются перед migrate без потери количеств."""
+
+    def setUp(self):
+        constraint = next(
+            constraint for constraint in Ingredient._meta.constraints
+            if constraint.name == "unique_ingredient"
+        )
+        # SQLite пересоздаёт таблицу по Meta модели, поэтому
+        # ограничение на время удаления убирается и из неё.
+        with mock.patch.object(Ingredient._meta, "constraints", []), \
+                connection.schema_editor() as editor:
+            editor.remove_constraint(Ingredient, constraint)
+        self.addCleanup(self.restore_constraint, constraint)
+
+    @staticmethod
+    def restore_constraint(constraint):
+        Ingredient.objects.all().delete()
+        with connection.schema_editor() as editor:
+            editor.add_constraint(Ingredient, constraint)
+
+    def test_merge(self):
+        kept, duplicate, other = Ingredient.objects.bulk_create([
+            Ingredient(name="соль", measurement_unit="г"),
+            Ingredient(name="соль", measurement_unit="г"),
+            Ingredient(name="соль", measurement_unit="кг"),
+        ])
+        author, user = create_user("author"), create_user("user")
+        both = create_recipe(author, ingredients=[kept, duplicate])
+        only_duplicate = create_recipe(author, ingredients=[duplicate])
+        ShopCart.objects.create(user=user, recipe=both)
+        ShopCart.objects.create(user=user, recipe=only_duplicate)
+
+        merge_duplicate_ingredients()
+
+        self.assertEqual(
+            set(Ingredient.objects.values_list("pk", flat=True)),
+            {kept.pk, other.pk},
+        )
+        self.assertEqual(
+            set(IngredientInRecipe.objects.values_list(
+                "recipe_id", "ingredient_id", "amount"
+            )),
+            {(both.pk, kept.pk, 20), (only_duplicate.pk, kept.pk, 10)},
+        )
+        self.assertEqual(
+            list(ShopCartIngredient.objects.values_list(
+                "ingredient_id", "amount"
+            )),
+            [(kept.pk, 30)],
+        )
+        self.assertEqual(CartTotalsService.drift([user.pk]), {})
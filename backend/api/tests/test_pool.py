@@ -0,0 +1,138 @@
+import os
+import sqlite3
+import tempfile
+import time
+
+from django.db import OperationalError, connections
+from django.db.backends.sqlite3 import base
+from django.test import SimpleTestCase, override_settings
+
+from backend.db import pool
+from backend.db.pool import ConnectionPool, PooledDatabaseWrapperMixin
+
+ALIAS = "pooled"
+
+
+class PooledSQLiteWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    """SQLite с пулом: поведение пула проверяется без PostgreSQL."""
+
+
+def connect():
+    return sqlite3.connect(":memory:", check_same_thread=False)
+
+
+def usable(connection):
+    return True
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    """Ограничение размера, ожидание и переиспользование соединений."""
+
+    def setUp(self):
+        self.pool = ConnectionPool(size=2, timeout=0.05, max_age=600)
+
+    def test_size_limit(self):
+        first = self.pool.acquire(connect, usable)
+        self.pool.acquire(connect, usable)
+        with self.assertRaises(OperationalError):
+            self.pool.acquire(connect, usable)
+        self.pool.release(first)
+        self.assertIs(self.pool.acquire(connect, usable), first)
+        self.assertEqual(self.pool.stats()["connections_created"], 2)
+        self.assertEqual(self.pool.stats()["timeouts"], 1)
+
+    def test_discards_broken_connections(self):
+        broken = self.pool.acquire(connect, usable)
+        self.pool.release(broken)
+        connection = self.pool.acquire(connect, lambda connection: False)
+        self.assertIsNot(connection, broken)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            broken.execute("SELECT 1")
+        self.pool.release(connection, discard=True)
+        self.assertEqual(self.pool.stats()["idle"], 0)
+        self.assertEqual(self.pool.stats()["in_use"], 0)
+
+    def test_failed_connect_frees_slot(self):
+        def fail():
+            raise OperationalError
+
+        for _ in range(3):
+            with self.assertRaises(OperationalError):
+                self.pool.acquire(fail, usable)
+        self.assertEqual(self.pool.stats()["in_use"], 0)
+
+
+@override_settings(DB_POOL_SIZE=1, DB_POOL_TIMEOUT=0.2, DB_POOL_MAX_AGE=600)
+class PooledDatabaseWrapperTest(SimpleTestCase):
+    """Обёртка Django возвращает соединения в пул при close()."""
+
+    def setUp(self):
+        handle, name = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(handle)
+        self.addCleanup(os.remove, name)
+        self.addCleanup(pool._pools.pop, ALIAS, None)
+        self.settings_dict = dict(
+            connections["default"].settings_dict,
+            NAME=name, CONN_HEALTH_CHECKS=True,
+        )
+
+    def wrapper(self):
+        wrapper = PooledSQLiteWrapper(self.settings_dict, ALIAS)
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    def test_timeout_from_settings(self):
+        self.wrapper().ensure_connection()
+        waiting = self.wrapper()
+        started = time.monotonic()
+        with self.assertRaises(OperationalError):
+            waiting.ensure_connection()
+        self.assertGreaterEqual(time.monotonic() - started, 0.2)
+        self.assertEqual(pool.pool_stats()[ALIAS]["timeouts"], 1)
+
+    def test_reuses_connection_after_close(self):
+        first = self.wrapper()
+        first.ensure_connection()
+        raw = first.connection
+        first.close()
+        second = self.wrapper()
+        second.ensure_connection()
+        self.assertIs(second.connection, raw)
+
+    def test_release_resets_autocommit(self):
+        first = self.wrapper()
+        first.set_autocommit(False)
+        with first.cursor() as cursor:
+            cursor.execute("CREATE TABLE row (id integer)")
+            cursor.execute("INSERT INTO row VALUES (1)")
+        raw = first.connection
+        self.assertTrue(raw.in_transaction)
+        first.close()
+        self.assertFalse(raw.in_transaction)
+        self.assertIsNone(raw.isolation_level)
+        second = self.wrapper()
+        second.ensure_connection()
+        self.assertIs(second.connection, raw)
+        self.assertTrue(second.get_autocommit())
+
+    def test_discards_closed_connection(self):
+        first = self.wrapper()
+        first.ensure_connection()
+        raw = first.connection
+        first.close()
+        raw.close()
+        second = self.wrapper()
+        second.ensure_connection()
+        self.assertIsNot(second.connection, raw)
+        with second.cursor() as cursor:
+            cursor.execute("SELECT 1")
+
+    def test_discards_connection_after_errors(self):
+        first = self.wrapper()
+        first.ensure_connection()
+        raw = first.connection
+        first.errors_occurred = True
+        first.close()
+        self.assertEqual(pool.pool_stats()[ALIAS]["idle"], 0)
+        with self.assertRaises(sqlite3.ProgrammingError):
+            raw.execute("SELECT 1")
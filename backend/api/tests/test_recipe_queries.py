@@ -0,0 +1,70 @@
+from api.metrics import assert_max_queries
+from recipes.models import Favorites, ShopCart
+from users.models import Fallow
+from .base import APITestCase, create_ingredients, create_recipe, create_tags
+
+
+class RecipeReadQueriesTest(APITestCase):
+    """Чтение рецептов укладывается в бюджет запросов,
+    и число запросов не растёт с размером страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        tags = create_tags(3)
+        ingredients = create_ingredients(5)
+        cls.recipes = [
+            create_recipe(cls.author, tags, ingredients, f"Рецепт {number}")
+            for number in range(12)
+        ]
+        cls.recipe = cls.recipes[-1]
+        Fallow.objects.create(user=cls.user, author=cls.author)
+        Favorites.objects.create(user=cls.user, recipe=cls.recipe)
+        ShopCart.objects.create(user=cls.user, recipe=cls.recipe)
+
+    def get(self, client, url, endpoint):
+        with assert_max_queries(endpoint=endpoint) as counter:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, counter.count
+
+    def test_list_within_budget(self):
+        for client in (self.guest, self.client):
+            with self.subTest(authenticated=client is self.client):
+                self.get(client, "/api/recipes/", "RecipeViewSet.list")
+
+    def test_list_queries_do_not_depend_on_page_size(self):
+        for client in (self.guest, self.client):
+            with self.subTest(authenticated=client is self.client):
+                self.get(client, "/api/recipes/", "RecipeViewSet.list")
+                counts = [
+                    self.get(
+                        client, f"/api/recipes/?limit={limit}",
+                        "RecipeViewSet.list",
+                    )[1]
+                    for limit in (1, 6, 12)
+                ]
+                self.assertEqual(len(set(counts)), 1, counts)
+
+    def test_retrieve_within_budget(self):
+        url = f"/api/recipes/{self.recipe.id}/"
+        for client in (self.guest, self.client):
+            with self.subTest(authenticated=client is self.client):
+                self.get(client, url, "RecipeViewSet.retrieve")
+
+    def test_user_flags_from_annotations(self):
+        response, _ = self.get(
+            self.client, "/api/recipes/?limit=12", "RecipeViewSet.list"
+        )
+        flags = {
+            item["id"]: (
+                item["is_favorited"], item["is_in_shopping_cart"],
+                item["author"]["is_subscribed"],
+            )
+            for item in response.data["results"]
+        }
+        self.assertEqual(flags.pop(self.recipe.id), (True, True, True))
+        self.assertEqual(set(flags.values()), {(False, False, True)})
+        self.assertEqual(
+            len(response.data["results"][0]["ingredients"]), 5
+        )
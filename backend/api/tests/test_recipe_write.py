@@ -0,0 +1,71 @@
+import shutil
+import tempfile
+
+from django.test import override_settings
+
+from api.cache import ingredients_cache, tags_cache
+from api.metrics import assert_max_queries
+from recipes.models import Recipe
+from .base import (APITestCase, create_ingredients, create_tags,
+                   image_data_uri)
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeCreateQueriesTest(APITestCase):
+    """Ингредиенты и теги рецепта проверяются пачкой: число запросов
+    при создании не зависит от числа ингредиентов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.tags = create_tags(3)
+        cls.ingredients = create_ingredients(50)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def payload(self, ingredient_ids):
+        return {
+            "name": "Рецепт",
+            "text": "Текст",
+            "cooking_time": 10,
+            "image": image_data_uri(),
+            "tags": [tag.id for tag in self.tags],
+            "ingredients": [
+                {"id": ingredient_id, "amount": 5}
+                for ingredient_id in ingredient_ids
+            ],
+        }
+
+    def create(self, ingredient_ids):
+        tags_cache.bump()
+        ingredients_cache.bump()
+        with assert_max_queries(endpoint="RecipeViewSet.create") as counter:
+            response = self.client.post(
+                "/api/recipes/", self.payload(ingredient_ids), format="json"
+            )
+        return response, counter.count
+
+    def test_queries_do_not_depend_on_ingredient_count(self):
+        counts = {}
+        for count in (1, 10, 50):
+            response, counts[count] = self.create(
+                [ingredient.id for ingredient in self.ingredients[:count]]
+            )
+            self.assertEqual(response.status_code, 201, response.data)
+            self.assertEqual(len(response.data["ingredients"]), count)
+        self.assertEqual(len(set(counts.values())), 1, counts)
+
+    def test_missing_ingredients_reported_per_item(self):
+        missing = [0, 10 ** 6]
+        response, _ = self.create([self.ingredients[0].id, *missing])
+        self.assertEqual(response.status_code, 400)
+        errors = response.data["ingredients"]
+        self.assertEqual(len(errors), 3)
+        self.assertFalse(errors[0])
+        self.assertTrue(all("id" in error for error in errors[1:]))
+        self.assertFalse(Recipe.objects.exists())
@@ -0,0 +1,40 @@
+from unittest import mock
+
+from django.test import AsyncClient
+from rest_framework.authtoken.models import Token
+
+from api.utils import ShoppingCartService
+from recipes.models import ShopCart
+from .base import APITestCase, create_ingredients, create_recipe
+
+URL = "/api/recipes/download_shopping_cart/"
+
+
+class ShoppingListStreamingTest(APITestCase):
+    """Список покупок отдаётся потоком и под WSGI, и под ASGI."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        recipe = create_recipe(cls.author, ingredients=create_ingredients(7))
+        ShopCart.objects.create(user=cls.user, recipe=recipe)
+
+    def test_wsgi(self):
+        response = self.client.get(URL, {"format": "csv"})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.is_async)
+        content = b"".join(response.streaming_content).decode()
+        self.assertEqual(len(content.splitlines()), 8)
+
+    @mock.patch.object(ShoppingCartService, "CHUNK_SIZE", 3)
+    async def test_asgi_streams_in_chunks(self):
+        token = await Token.objects.aget(user=self.user)
+        response = await AsyncClient().get(
+            URL, {"format": "csv"},
+            headers={"Authorization": f"Token {token.key}"},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        self.assertEqual(len(chunks), 3)
+        self.assertEqual(len(b"".join(chunks).decode().splitlines()), 8)
@@ -0,0 +1,56 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.http import QueryDict
+
+from api.filters import RecipeFilter
+from api.metrics import assert_max_queries
+from recipes.models import Recipe
+from .base import (APITestCase, create_recipe, create_tags, explain,
+                   index_names, used_indexes)
+
+
+class TagFilterTest(APITestCase):
+    """Фильтр по нескольким тегам: каждый рецепт один раз,
+    без DISTINCT и JOIN по всей таблице тегов рецептов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.tags = create_tags(3)
+        cls.both = create_recipe(cls.author, cls.tags[:2], name="Оба тега")
+        cls.first = create_recipe(cls.author, cls.tags[:1], name="Первый")
+        cls.other = create_recipe(cls.author, cls.tags[2:], name="Другой")
+
+    def filtered(self, *slugs):
+        data = QueryDict(mutable=True)
+        data.setlist("tags", slugs)
+        return RecipeFilter(data, queryset=Recipe.objects.all()).qs
+
+    def test_recipes_with_several_tags_are_not_duplicated(self):
+        with assert_max_queries(endpoint="RecipeViewSet.list"):
+            response = self.client.get(
+                "/api/recipes/?tags=tag-0&tags=tag-1&limit=10"
+            )
+        self.assertEqual(response.status_code, 200)
+        ids = [item["id"] for item in response.data["results"]]
+        self.assertCountEqual(ids, [self.both.id, self.first.id])
+        self.assertEqual(response.data["count"], 2)
+
+    def test_unknown_tag_is_rejected(self):
+        response = self.client.get("/api/recipes/?tags=unknown")
+        self.assertEqual(response.status_code, 400)
+
+    def test_filter_uses_exists_without_distinct(self):
+        sql = str(self.filtered("tag-0", "tag-1").query).upper()
+        self.assertIn("EXISTS", sql)
+        self.assertNotIn("DISTINCT", sql)
+
+    @skipUnless(connection.vendor == "postgresql", "EXPLAIN PostgreSQL")
+    def test_filter_plan_uses_tag_index(self):
+        plan = explain(self.filtered("tag-0", "tag-1"))
+        self.assertNotIn("Unique", plan)
+        self.assertNotIn("HashAggregate", plan)
+        self.assertTrue(
+            used_indexes(plan) & index_names(Recipe.tags.through), plan
+        )
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
@@ -13,7 +14,22 @@ router.register(prefix='users', viewset=CustomUserViewSet)
 router.register(prefix='recipes', viewset=RecipeViewSet)
 router.register(prefix='ingredients', viewset=IngredientsViewSet)
 
-urlpatterns = [
+urlpatterns = []
+
+if settings.ASYNC_VIEWS:
+    from . import async_views
+
+    urlpatterns += [
+        path('recipes/', async_views.recipe_list,
+             name='recipes-list-async'),
+        path('recipes/<int:pk>/', async_views.recipe_detail,
+             name='recipes-detail-async'),
+        path('ingredients/', async_views.ingredient_list,
+             name='ingredients-list-async'),
+        path('tags/', async_views.tag_list, name='tags-list-async'),
+    ]
+
+urlpatterns += [
     path('', include(router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
@@ -1,36 +1,374 @@
+import csv
 import datetime
+import tempfile
+from itertools import islice
 
-from django.db.models import Sum
-from django.http import HttpResponse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections, router
+from django.db.models import Case, F, Sum, Value, When
+from django.db.models.signals import post_save
+from django.db.models.sql import DeleteQuery
+from django.http import FileResponse, StreamingHttpResponse
 
-from recipes.models import IngredientInRecipe
+from recipes.models import IngredientInRecipe, ShopCart, ShopCartIngredient
+
+
+def insert_ignore(*objs, returning=None):
+    """Вставляет строки одним INSERT ... ON CONFLICT DO NOTHING.
+
+    Для одного объекта возвращает True, если строка добавлена, и False,
+    если её уже вставил параллельный запрос. Сигнал post_save
+    отправляется вручную, чтобы счётчики и ленты обновлялись как при
+    save().
+
+    С returning вставляется пачка объектов одного класса: возвращаются
+    значения этого поля у добавленных строк, сигналы не отправляются.
+    """
+    if not objs:
+        return []
+    model = type(objs[0])
+    using = router.db_for_write(model, instance=objs[0])
+    connection = connections[using]
+    fields = [
+        field for field in model._meta.concrete_fields
+        if field is not model._meta.pk
+    ]
+    returned = model._meta.get_field(returning) if returning else (
+        model._meta.pk
+    )
+    values = [
+        field.get_db_prep_save(field.pre_save(obj, True), connection)
+        for obj in objs for field in fields
+    ]
+    row = f"({', '.join(['%s'] * len(fields))})"
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(model._meta.db_table)} "
+            f"({', '.join(quote(field.column) for field in fields)}) "
+            f"VALUES {', '.join([row] * len(objs))} "
+            f"ON CONFLICT DO NOTHING "
+            f"RETURNING {quote(returned.column)}",
+            values,
+        )
+        rows = cursor.fetchall()
+    if returning is not None:
+        return [value for value, in rows]
+    obj, = objs
+    if not rows:
+        return False
+    obj.pk = rows[0][0]
+    obj._state.adding = False
+    obj._state.db = using
+    post_save.send(
+        sender=model, instance=obj, created=True,
+        update_fields=None, raw=False, using=using,
+    )
+    return True
+
+
+def delete_returning(queryset, returning):
+    """Удаляет строки queryset одним DELETE ... RETURNING.
+
+    Возвращает значения поля returning у удалённых строк. Сигналы
+    и каскады не выполняются: их последствия учитывает вызывающий код.
+    """
+    model = queryset.model
+    using = router.db_for_write(model)
+    connection = connections[using]
+    sql, params = queryset.query.chain(DeleteQuery).get_compiler(
+        using
+    ).as_sql()
+    column = connection.ops.quote_name(
+        model._meta.get_field(returning).column
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(f"{sql} RETURNING {column}", params)
+        return [value for value, in cursor.fetchall()]
+
+
+async def aiter_chunks(iterator, size):
+    """Асинхронный обход синхронного итератора строк пачками по size.
+
+    Под ASGI Django 4.2 собирает синхронный итератор
+    StreamingHttpResponse в память целиком, прежде чем отдать первый
+    байт. Пачки читаются в потоке запроса, где открыто его соединение
+    с базой.
+    """
+    read = sync_to_async(lambda: list(islice(iterator, size)))
+    while True:
+        chunk = await read()
+        if not chunk:
+            return
+        yield "".join(chunk)
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+class CartTotalsService:
+    """Поддержка таблицы итогов списка покупок в актуальном состоянии."""
+
+    BATCH_SIZE = 1000
+
+    @staticmethod
+    def recipe_amounts(recipe_id):
+        return dict(IngredientInRecipe.objects.filter(
+            recipe_id=recipe_id
+        ).values_list("ingredient_id", "amount"))
+
+    @classmethod
+    def apply(cls, user_ids, deltas):
+        """Прибавляет deltas {ingredient_id: amount} к итогам пользователей.
+
+        Два запроса на любое число пользователей и ингредиентов:
+        вставка недостающих строк и одно UPDATE с CASE по ингредиенту.
+        """
+        deltas = {
+            ingredient_id: amount
+            for ingredient_id, amount in deltas.items() if amount
+        }
+        user_ids = list(user_ids)
+        if not deltas or not user_ids:
+            return
+        ShopCartIngredient.objects.bulk_create(
+            [
+                ShopCartIngredient(user_id=user_id, ingredient_id=ingredient)
+                for user_id in user_ids for ingredient in deltas
+            ],
+            batch_size=cls.BATCH_SIZE,
+            ignore_conflicts=True,
+        )
+        totals = ShopCartIngredient.objects.filter(
+            user_id__in=user_ids, ingredient_id__in=deltas
+        )
+        totals.update(amount=F("amount") + Case(
+            *(When(ingredient_id=ingredient, then=Value(amount))
+              for ingredient, amount in deltas.items()),
+            default=Value(0),
+        ))
+        if min(deltas.values()) < 0:
+            totals.filter(amount__lte=0).delete()
+
+    @staticmethod
+    def recipes_amounts(recipe_ids):
+        """Суммарный состав нескольких рецептов одним запросом."""
+        amounts = {}
+        for ingredient, amount in IngredientInRecipe.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list("ingredient_id", "amount"):
+            amounts[ingredient] = amounts.get(ingredient, 0) + amount
+        return amounts
+
+    @classmethod
+    def add_recipes(cls, user_id, recipe_ids):
+        cls.apply([user_id], cls.recipes_amounts(recipe_ids))
+
+    @classmethod
+    def remove_recipes(cls, user_id, recipe_ids):
+        cls.apply([user_id], {
+            ingredient: -amount
+            for ingredient, amount in cls.recipes_amounts(recipe_ids).items()
+        })
+
+    @classmethod
+    def add_recipe(cls, user_id, recipe_id):
+        cls.apply([user_id], cls.recipe_amounts(recipe_id))
+
+    @classmethod
+    def remove_recipe(cls, user_id, recipe_id):
+        cls.remove_recipe_for_users([user_id], recipe_id)
+
+    @classmethod
+    def remove_recipe_for_users(cls, user_ids, recipe_id):
+        cls.apply(user_ids, {
+            ingredient: -amount
+            for ingredient, amount in cls.recipe_amounts(recipe_id).items()
+        })
+
+    @classmethod
+    def change_recipe(cls, recipe_id, old_amounts, new_amounts):
+        """Переносит изменение состава рецепта в корзины с этим рецептом."""
+        deltas = {
+            ingredient: new_amounts.get(ingredient, 0)
+            - old_amounts.get(ingredient, 0)
+            for ingredient in old_amounts.keys() | new_amounts.keys()
+        }
+        if not any(deltas.values()):
+            return
+        cls.apply(
+            ShopCart.objects.filter(
+                recipe_id=recipe_id
+            ).values_list("user_id", flat=True),
+            deltas,
+        )
+
+    @staticmethod
+    def expected_totals(user_ids=None):
+        """Итоги, посчитанные заново по корзинам."""
+        queryset = IngredientInRecipe.objects.filter(
+            recipe__shopping_cart__isnull=False
+        )
+        if user_ids is not None:
+            queryset = queryset.filter(
+                recipe__shopping_cart__user_id__in=user_ids
+            )
+        return {
+            (user_id, ingredient): amount
+            for user_id, ingredient, amount in queryset.values(
+                "recipe__shopping_cart__user_id", "ingredient_id"
+            ).annotate(total=Sum("amount")).order_by().values_list(
+                "recipe__shopping_cart__user_id", "ingredient_id", "total"
+            )
+        }
+
+    @staticmethod
+    def stored_totals(user_ids=None):
+        queryset = ShopCartIngredient.objects.all()
+        if user_ids is not None:
+            queryset = queryset.filter(user_id__in=user_ids)
+        return {
+            (user_id, ingredient): amount
+            for user_id, ingredient, amount in queryset.values_list(
+                "user_id", "ingredient_id", "amount"
+            )
+        }
+
+    @classmethod
+    def drift(cls, user_ids=None):
+        """Расхождения итогов с корзинами.
+
+        {(user_id, ingredient_id): (в таблице, должно быть)}.
+        """
+        expected = cls.expected_totals(user_ids)
+        stored = cls.stored_totals(user_ids)
+        return {
+            key: (stored.get(key, 0), expected.get(key, 0))
+            for key in expected.keys() | stored.keys()
+            if stored.get(key, 0) != expected.get(key, 0)
+        }
+
+    @classmethod
+    def rebuild(cls, user_ids=None):
+        queryset = ShopCartIngredient.objects.all()
+        if user_ids is not None:
+            queryset = queryset.filter(user_id__in=user_ids)
+        queryset.delete()
+        ShopCartIngredient.objects.bulk_create(
+            [
+                ShopCartIngredient(
+                    user_id=user_id, ingredient_id=ingredient, amount=amount
+                )
+                for (user_id, ingredient), amount
+                in cls.expected_totals(user_ids).items()
+            ],
+            batch_size=cls.BATCH_SIZE,
+        )
 
 
 class ShoppingCartService:
 
+    CHUNK_SIZE = 500
+    CONTENT_TYPES = {
+        "txt": "text/plain; charset=utf-8",
+        "csv": "text/csv; charset=utf-8",
+    }
+
     @staticmethod
-    def download_shopping_cart(user):
-        ingredients = IngredientInRecipe.objects.filter(
-            recipe__shopping_cart__user=user
+    def get_ingredients(user):
+        """Суммы ингредиентов корзины из таблицы итогов."""
+        return ShopCartIngredient.objects.filter(
+            user=user, amount__gt=0
         ).values(
             "ingredient__name",
             "ingredient__measurement_unit"
-        ).annotate(amount=Sum("amount"))
-        today = datetime.datetime.today()
-        shopping_list = (
+        ).annotate(
+            total=Sum("amount")
+        ).order_by(
+            "ingredient__name",
+            "ingredient__measurement_unit"
+        )
+
+    def iter_ingredients(self, user):
+        return self.get_ingredients(user).iterator(chunk_size=self.CHUNK_SIZE)
+
+    def txt_rows(self, user, today):
+        yield (
             f"Список покупок: {user.get_full_name()}\n\n"
             f"Дата: {today:%Y-%m-%d}\n\n"
         )
-        shopping_list += "\n".join([
-            f"- {ingredient['ingredient__name']} "
-            f"({ingredient['ingredient__measurement_unit']})"
-            f" - {ingredient['amount']}"
-            for ingredient in ingredients
-        ])
-        shopping_list += f"\n\nFoodgram ({today:%Y})"
-        filename = f"{user.username}_shopping_list.txt"
-        response = HttpResponse(
-            shopping_list, content_type="text.txt; charset=utf-8"
+        separator = ""
+        for ingredient in self.iter_ingredients(user):
+            yield (
+                f"{separator}- {ingredient['ingredient__name']} "
+                f"({ingredient['ingredient__measurement_unit']})"
+                f" - {ingredient['total']}"
+            )
+            separator = "\n"
+        yield f"\n\nFoodgram ({today:%Y})"
+
+    def csv_rows(self, user, today):
+        writer = csv.writer(Echo())
+        yield writer.writerow(("name", "measurement_unit", "amount"))
+        for ingredient in self.iter_ingredients(user):
+            yield writer.writerow((
+                ingredient["ingredient__name"],
+                ingredient["ingredient__measurement_unit"],
+                ingredient["total"],
+            ))
+
+    def pdf_file(self, user, today):
+        """PDF собирается во временный файл, а не в памяти воркера."""
+        from reportlab.lib.pagesizes import A4
+        from reportlab.pdfbase import pdfmetrics
+        from reportlab.pdfbase.ttfonts import TTFont
+        from reportlab.pdfgen import canvas
+
+        font = "ShoppingListFont"
+        if font not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont(font, settings.PDF_FONT_PATH))
+        buffer = tempfile.SpooledTemporaryFile(
+            max_size=settings.SHOPPING_LIST_SPOOL_SIZE
+        )
+        width, height = A4
+        margin, line_height, font_size = 50, 18, 12
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        pdf.setFont(font, font_size)
+        y = height - margin
+        for line in self.txt_rows(user, today):
+            for text in line.split("\n"):
+                if y < margin:
+                    pdf.showPage()
+                    pdf.setFont(font, font_size)
+                    y = height - margin
+                pdf.drawString(margin, y, text)
+                y -= line_height
+        pdf.save()
+        buffer.seek(0)
+        return buffer
+
+    def download_shopping_cart(self, user, file_format="txt",
+                               asynchronous=False):
+        """Файл списка покупок; asynchronous — для запроса под ASGI."""
+        today = datetime.datetime.today()
+        filename = f"{user.username}_shopping_list.{file_format}"
+        if file_format == "pdf":
+            return FileResponse(
+                self.pdf_file(user, today),
+                as_attachment=True,
+                filename=filename,
+                content_type="application/pdf",
+            )
+        rows = getattr(self, f"{file_format}_rows")(user, today)
+        if asynchronous:
+            rows = aiter_chunks(rows, self.CHUNK_SIZE)
+        response = StreamingHttpResponse(
+            rows, content_type=self.CONTENT_TYPES[file_format]
         )
         response["Content-Disposition"] = f"attachment; filename={filename}"
         return response
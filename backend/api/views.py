@@ -1,23 +1,61 @@
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.db.models import (BooleanField, Count, Exists, F, Max, OuterRef,
+                              Prefetch, Value, Window)
+from django.db.models.functions import RowNumber
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.permissions import (AllowAny, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from recipes.models import Favorites, Ingredient, Recipe, ShopCart, Tag
+from recipes.counters import change_counters
+from recipes.models import (Favorites, Ingredient, IngredientInRecipe,
+                            Recipe, ShopCart, Tag)
+from recipes.popularity import mark_dirty, popular_recipes
+from recipes.timeline import timeline_filter
 from users.models import Fallow, UserFoodgram
+from .cache import (get_ingredients, get_tags, get_tags_by_ids,
+                    ingredients_cache, subscriptions_cache, tags_cache)
+from .conditional import (ingredients_etag, make_etag, not_modified,
+                          set_validators, tags_etag, user_state_version)
 from .filters import IngredientFilter, RecipeFilter
-from .paginators import CustomPagination
+from .paginators import (CustomPagination, PopularPagination,
+                         TimelinePagination)
 from .permissions import SAFE_METHODS, AuthorOrStaffOrReadOnly
-from .serializers import (FallowFoodgramSerializer, IngredientSerializer,
-                          ReadRecipeSerializer, ReadUserFoodgramSerializer,
-                          RecipeShortSerializer, RecipeWriteSerializer,
-                          TagSerializer)
-from .utils import ShoppingCartService
+from .renderers import (CsvShoppingListRenderer, PdfShoppingListRenderer,
+                        ShoppingListNegotiation, TxtShoppingListRenderer)
+from .serializers import (BulkRecipesSerializer, FallowFoodgramSerializer,
+                          IngredientSerializer, ReadRecipeSerializer,
+                          ReadUserFoodgramSerializer, RecipeShortSerializer,
+                          RecipeWriteSerializer, TagSerializer)
+from .utils import (CartTotalsService, ShoppingCartService, delete_returning,
+                    insert_ignore)
+
+COUNTER_FIELDS = {
+    Favorites: "favorites_count",
+    ShopCart: "shopping_cart_count",
+}
+
+
+def get_cached_object(lookup, pk):
+    """Объект справочника из кеша или 404."""
+    try:
+        pk = int(pk)
+    except ValueError:
+        raise Http404
+    obj = lookup([pk]).get(pk)
+    if obj is None:
+        raise Http404
+    return obj
 
 
 class TagsViewSet(viewsets.ReadOnlyModelViewSet):
@@ -26,6 +64,32 @@ class TagsViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [AllowAny]
     serializer_class = TagSerializer
 
+    def get_object(self):
+        return get_cached_object(get_tags_by_ids, self.kwargs["pk"])
+
+    def retrieve(self, request, *args, **kwargs):
+        etag = make_etag(tags_etag(), kwargs["pk"])
+        response = not_modified(request, etag) or super().retrieve(
+            request, *args, **kwargs
+        )
+        return set_validators(
+            response, etag, public=True, max_age=settings.CATALOGUE_MAX_AGE
+        )
+
+    @staticmethod
+    def list_data():
+        return tags_cache.get(
+            "list",
+            lambda: TagSerializer(get_tags().values(), many=True).data
+        )
+
+    def list(self, request, *args, **kwargs):
+        etag = tags_etag()
+        response = not_modified(request, etag) or Response(self.list_data())
+        return set_validators(
+            response, etag, public=True, max_age=settings.CATALOGUE_MAX_AGE
+        )
+
 
 class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
 
@@ -35,6 +99,35 @@ class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_class = IngredientFilter
 
+    def get_object(self):
+        return get_cached_object(get_ingredients, self.kwargs["pk"])
+
+    def retrieve(self, request, *args, **kwargs):
+        etag = make_etag(ingredients_etag(), kwargs["pk"])
+        response = not_modified(request, etag) or super().retrieve(
+            request, *args, **kwargs
+        )
+        return set_validators(
+            response, etag, public=True, max_age=settings.CATALOGUE_MAX_AGE
+        )
+
+    def list(self, request, *args, **kwargs):
+        etag = make_etag(ingredients_etag(), request.get_full_path())
+        response = not_modified(request, etag)
+        if response is None:
+            response = self.list_response(request, *args, **kwargs)
+        return set_validators(
+            response, etag, public=True, max_age=settings.CATALOGUE_MAX_AGE
+        )
+
+    def list_response(self, request, *args, **kwargs):
+        if request.query_params.get("name"):
+            return super().list(request, *args, **kwargs)
+        return Response(ingredients_cache.get(
+            "list",
+            lambda: IngredientSerializer(self.get_queryset(), many=True).data
+        ))
+
 
 class RecipeViewSet(viewsets.ModelViewSet):
 
@@ -44,9 +137,131 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
 
+    @property
+    def omit_user_fields(self):
+        """?user_fields=false: ответ без полей текущего пользователя.
+
+        Такой ответ одинаков для всех и кешируется общим кешем,
+        а состояние пользователя клиент берёт из /users/state/.
+        """
+        return self.request.query_params.get("user_fields") in (
+            "0", "false", "False"
+        )
+
+    @property
+    def is_user_specific(self):
+        if not self.omit_user_fields:
+            return True
+        return any(
+            name in self.request.query_params
+            for name in ("is_favorited", "is_in_shopping_cart")
+        )
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["omit_user_fields"] = self.omit_user_fields
+        return context
+
+    def get_queryset(self):
+        if self.request.method not in SAFE_METHODS:
+            return Recipe.objects.all()
+        return self.get_read_queryset(
+            self.request.user, user_fields=not self.omit_user_fields
+        )
+
+    @staticmethod
+    def get_read_queryset(user, user_fields=True):
+        """Рецепты для чтения: связи и флаги пользователя одним запросом."""
+        queryset = Recipe.objects.select_related("author").prefetch_related(
+            "tags",
+            Prefetch(
+                "ingridients_recipe",
+                queryset=IngredientInRecipe.objects.select_related(
+                    "ingredient"
+                ),
+            ),
+        )
+        if not user_fields:
+            return queryset
+        if user.is_anonymous:
+            false = Value(False, output_field=BooleanField())
+            return queryset.annotate(
+                is_favorited=false,
+                is_in_shopping_cart=false,
+                author_is_subscribed=false,
+            )
+        return queryset.annotate(
+            is_favorited=Exists(Favorites.objects.filter(
+                user=user, recipe=OuterRef("pk")
+            )),
+            is_in_shopping_cart=Exists(ShopCart.objects.filter(
+                user=user, recipe=OuterRef("pk")
+            )),
+            author_is_subscribed=Exists(Fallow.objects.filter(
+                user=user, author=OuterRef("author")
+            )),
+        )
+
+    def list_validators(self, request):
+        """ETag и Last-Modified списка до выборки страницы.
+
+        Одна агрегация по отобранным рецептам даёт их число, которое
+        пагинатор берёт вместо COUNT(*), и время последнего изменения.
+        Удаление рецепта меняет только число, поэтому его видит ETag,
+        но не Last-Modified.
+        """
+        changes = self.filter_queryset(Recipe.objects.all()).aggregate(
+            count=Count("pk"), updated=Max("updated")
+        )
+        self.paginator.known_count = changes["count"]
+        shared = not self.is_user_specific
+        state = None if shared else user_state_version(request.user)
+        etag = make_etag(
+            request.get_full_path(), changes,
+            state, tags_etag(), ingredients_etag(),
+        )
+        # Изменения состояния пользователя не имеют даты,
+        # поэтому Last-Modified отдаётся только общим ответам.
+        last_modified = changes["updated"] if shared else None
+        return {"etag": etag, "last_modified": last_modified,
+                "public": shared}
+
+    def retrieve_validators(self, request, pk):
+        """ETag и Last-Modified рецепта или None, если его нет."""
+        updated = Recipe.objects.filter(
+            pk=pk
+        ).values_list("updated", flat=True).first()
+        if updated is None:
+            return None
+        shared = not self.is_user_specific
+        state = None if shared else user_state_version(request.user)
+        etag = make_etag(
+            request.get_full_path(), updated,
+            state, tags_etag(), ingredients_etag(),
+        )
+        last_modified = updated if shared else None
+        return {"etag": etag, "last_modified": last_modified,
+                "public": shared}
+
+    def list(self, request, *args, **kwargs):
+        validators = self.list_validators(request)
+        response = not_modified(
+            request, validators["etag"], validators["last_modified"]
+        ) or super().list(request, *args, **kwargs)
+        return set_validators(response, **validators)
+
+    def retrieve(self, request, *args, **kwargs):
+        validators = self.retrieve_validators(request, kwargs["pk"])
+        if validators is None:
+            return super().retrieve(request, *args, **kwargs)
+        response = not_modified(
+            request, validators["etag"], validators["last_modified"]
+        ) or super().retrieve(request, *args, **kwargs)
+        return set_validators(response, **validators)
+
     def get_serializer_class(self):
 
-        if self.action in (SAFE_METHODS or ["retrieve", "list"]):
+        if self.request.method in SAFE_METHODS:
             return ReadRecipeSerializer
         return RecipeWriteSerializer
 
@@ -88,12 +303,56 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return self.add_to_target(ShopCart, request.user, pk)
         return self.delete_from_target(ShopCart, request.user, pk)
 
+    @action(
+        detail=False,
+        methods=["post", "delete"],
+        url_path="favorite/bulk",
+        permission_classes=[IsAuthenticated],
+    )
+    def favorite_bulk(self, request):
+        """Пакетное добавление и удаление рецептов в избранном."""
+        return self.bulk_target(Favorites, request)
+
+    @action(
+        detail=False,
+        methods=["post", "delete"],
+        url_path="shopping_cart/bulk",
+        permission_classes=[IsAuthenticated],
+    )
+    def shopping_cart_bulk(self, request):
+        """Пакетное добавление и удаление рецептов в списке покупок."""
+        return self.bulk_target(ShopCart, request)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        pagination_class=PopularPagination,
+    )
+    def popular(self, request):
+        """Рецепты по убыванию рейтинга популярности."""
+        queryset = popular_recipes(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=[IsAuthenticated],
+        pagination_class=TimelinePagination,
+    )
+    def timeline(self, request):
+        """Рецепты авторов, на которых подписан пользователь."""
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            timeline_filter(request.user)
+        )
+        page = self.paginate_queryset(queryset)
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
+
     @staticmethod
+    @transaction.atomic
     def add_to_target(model, user, pk):
-        if model.objects.filter(user=user, recipe__id=pk).exists():
-            return Response(
-                data={"errors": "Рецепт уже добавлен!"},
-                status=status.HTTP_400_BAD_REQUEST)
         try:
             recipe = Recipe.objects.get(id=pk)
         except Recipe.DoesNotExist:
@@ -101,37 +360,111 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 data={"errors": "Рецепт не существует!"},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        model.objects.create(user=user, recipe=recipe)
+        if not insert_ignore(model(user=user, recipe=recipe)):
+            return Response(
+                data={"errors": "Рецепт уже добавлен!"},
+                status=status.HTTP_400_BAD_REQUEST)
         serializer = RecipeShortSerializer(recipe)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @staticmethod
+    @transaction.atomic
     def delete_from_target(model, user, pk):
-        try:
-            Recipe.objects.get(id=pk)
-        except Recipe.DoesNotExist:
+        deleted, _ = model.objects.filter(user=user, recipe_id=pk).delete()
+        if deleted:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        if not Recipe.objects.filter(id=pk).exists():
             return Response(
                 data={"errors": "Рецепт не существует!"},
                 status=status.HTTP_404_NOT_FOUND
             )
-        obj = model.objects.filter(user=user, recipe__id=pk)
-        if obj.exists():
-            obj.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
         return Response(
             data={"errors": "Рецепт не существует!"},
             status=status.HTTP_400_BAD_REQUEST
         )
 
+    def bulk_target(self, model, request):
+        serializer = BulkRecipesSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        ids = serializer.validated_data["recipes"]
+        if request.method == "POST":
+            results = self.bulk_add_to_target(model, request.user, ids)
+        else:
+            results = self.bulk_delete_from_target(model, request.user, ids)
+        return Response({"results": results})
+
+    @staticmethod
+    @transaction.atomic
+    def bulk_add_to_target(model, user, ids):
+        """Добавляет рецепты за постоянное число запросов.
+
+        Вставка сама отбирает строки, которых ещё нет, в том числе
+        с учётом параллельных запросов. Сигналы при этом не вызываются,
+        поэтому счётчики, итоги корзины и отметки рейтинга обновляются
+        здесь же и только для добавленных рецептов.
+        """
+        recipes = Recipe.objects.in_bulk(ids)
+        added = insert_ignore(
+            *(model(user=user, recipe_id=pk) for pk in recipes),
+            returning="recipe",
+        )
+        if added:
+            change_counters(Recipe, added, COUNTER_FIELDS[model], 1)
+            mark_dirty(added)
+            if model is ShopCart:
+                CartTotalsService.add_recipes(user.id, added)
+        added = set(added)
+        results = []
+        for pk in ids:
+            if pk not in recipes:
+                results.append({"id": pk, "status": "not_found"})
+                continue
+            results.append({
+                "id": pk,
+                "status": "added" if pk in added else "exists",
+                "recipe": RecipeShortSerializer(recipes[pk]).data,
+            })
+        return results
+
+    @staticmethod
+    @transaction.atomic
+    def bulk_delete_from_target(model, user, ids):
+        """Удаляет рецепты одним DELETE ... RETURNING.
+
+        Удаление через queryset вызывало бы сигналы для каждой строки,
+        поэтому счётчики, итоги корзины и отметки рейтинга обновляются
+        здесь же пачкой и только для удалённых рецептов.
+        """
+        removed = delete_returning(
+            model.objects.filter(user=user, recipe_id__in=ids), "recipe"
+        )
+        if removed:
+            change_counters(Recipe, removed, COUNTER_FIELDS[model], -1)
+            mark_dirty(removed)
+            if model is ShopCart:
+                CartTotalsService.remove_recipes(user.id, removed)
+        removed = set(removed)
+        return [
+            {"id": pk, "status": "removed" if pk in removed else "not_found"}
+            for pk in ids
+        ]
+
     @action(
         detail=False,
         methods=["get"],
         permission_classes=[IsAuthenticated],
+        renderer_classes=[TxtShoppingListRenderer, CsvShoppingListRenderer,
+                          PdfShoppingListRenderer],
+        content_negotiation_class=ShoppingListNegotiation,
     )
     def download_shopping_cart(self, request):
+        """Выгрузка списка покупок: ?format=txt|csv|pdf."""
         user = request.user
         shopping_cart_service = ShoppingCartService()
-        response = shopping_cart_service.download_shopping_cart(user)
+        response = shopping_cart_service.download_shopping_cart(
+            user, request.accepted_renderer.format,
+            asynchronous=isinstance(request._request, ASGIRequest),
+        )
         return response
 
 
@@ -147,6 +480,7 @@ class CustomUserViewSet(UserViewSet):
         methods=["post", "delete"],
         permission_classes=[IsAuthenticated]
     )
+    @transaction.atomic
     def subscribe(self, request, **kwargs):
         user = request.user
         author_id = self.kwargs.get("id")
@@ -159,31 +493,89 @@ class CustomUserViewSet(UserViewSet):
                 context={"request": request}
             )
             serializer.is_valid(raise_exception=True)
-            Fallow.objects.create(user=user, author=author)
+            if not insert_ignore(Fallow(user=user, author=author)):
+                raise ValidationError(
+                    detail={api_settings.NON_FIELD_ERRORS_KEY: [
+                        "Вы уже подписаны на этого пользователя!"
+                    ]},
+                    code=status.HTTP_400_BAD_REQUEST
+                )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
         if request.method == "DELETE":
-            subscription = Fallow.objects.filter(
+            deleted, _ = Fallow.objects.filter(
                 user=user,
                 author=author
-            )
-            if subscription.exists():
-                subscription.delete()
+            ).delete()
+            if deleted:
                 return Response(status=status.HTTP_204_NO_CONTENT)
             return Response(
                 data={"errors": "Такой подписки не существует!"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=[IsAuthenticated],
+    )
+    def state(self, request):
+        """Id избранного, корзины и подписок текущего пользователя."""
+        user = request.user
+        version = user_state_version(user)
+        etag = f'"{version}"'
+        response = not_modified(request, etag) or Response({
+            "version": version,
+            "favorites": Favorites.objects.filter(
+                user=user
+            ).order_by("recipe_id").values_list("recipe_id", flat=True),
+            "shopping_cart": ShopCart.objects.filter(
+                user=user
+            ).order_by("recipe_id").values_list("recipe_id", flat=True),
+            "subscriptions": Fallow.objects.filter(
+                user=user
+            ).order_by("author_id").values_list("author_id", flat=True),
+        })
+        return set_validators(response, etag)
+
+    @staticmethod
+    def get_subscriptions_queryset(user, recipes_limit):
+        """Авторы, на которых подписан user, с не более чем
+        recipes_limit последними рецептами каждого."""
+        recipes = Recipe.objects.order_by("-created")
+        if recipes_limit is not None:
+            recipes = recipes.annotate(
+                author_row=Window(
+                    RowNumber(),
+                    partition_by=F("author"),
+                    order_by=F("created").desc(),
+                )
+            ).filter(author_row__lte=recipes_limit)
+        return UserFoodgram.objects.filter(follow__user=user).annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+        ).prefetch_related(
+            Prefetch("recipes", queryset=recipes, to_attr="limited_recipes")
+        )
+
     @action(
         detail=False,
         permission_classes=[IsAuthenticated]
     )
     def subscriptions(self, request):
         user = request.user
-        queryset = UserFoodgram.objects.filter(follow__user=user)
+        path = request.get_full_path()
+        data = subscriptions_cache.get(user.id, path)
+        if data is not None:
+            return Response(data)
+        queryset = self.get_subscriptions_queryset(
+            user, FallowFoodgramSerializer.get_recipes_limit(request)
+        )
         pages = self.paginate_queryset(queryset)
         serializer = FallowFoodgramSerializer(pages,
                                               many=True,
                                               context={"request": request})
-        return self.get_paginated_response(serializer.data)
+        response = self.get_paginated_response(serializer.data)
+        subscriptions_cache.set(
+            user.id, path, [author.id for author in pages], response.data
+        )
+        return response
@@ -12,5 +12,9 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+# Под ASGI запросы обслуживаются из пула потоков, поэтому вместо
+# постоянных соединений по потокам используется общий пул.
+os.environ.setdefault('DB_POOL', 'True')
+os.environ.setdefault('ASYNC_VIEWS', 'True')
 
 application = get_asgi_application()
@@ -0,0 +1,159 @@
+import threading
+import time
+from contextlib import closing
+
+from django.conf import settings
+from django.db import OperationalError
+
+
+class ConnectionPool:
+    """Пул соединений одного алиаса базы, общий для потоков процесса.
+
+    Не больше size соединений одновременно; если все заняты,
+    запрос ждёт освобождения до timeout секунд.
+    """
+
+    def __init__(self, size, timeout, max_age):
+        self.size = size
+        self.timeout = timeout
+        self.max_age = max_age
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._idle = []
+        self._created = {}
+        self.in_use = 0
+        self.acquired = 0
+        self.connections_created = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "size": self.size,
+                "in_use": self.in_use,
+                "idle": len(self._idle),
+                "acquired": self.acquired,
+                "connections_created": self.connections_created,
+                "wait_seconds": self.wait_seconds,
+                "timeouts": self.timeouts,
+            }
+
+    def acquire(self, connect, is_usable):
+        """Свободное соединение из пула или новое через connect()."""
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise OperationalError(
+                f"Все {self.size} соединений пула заняты "
+                f"дольше {self.timeout} с"
+            )
+        with self._lock:
+            self.in_use += 1
+            self.acquired += 1
+            self.wait_seconds += time.monotonic() - started
+        try:
+            while True:
+                with self._lock:
+                    connection = self._idle.pop() if self._idle else None
+                if connection is None:
+                    connection = connect()
+                    with self._lock:
+                        self._created[id(connection)] = time.monotonic()
+                        self.connections_created += 1
+                    return connection
+                created = self._created.get(id(connection), 0)
+                if (time.monotonic() - created < self.max_age
+                        and is_usable(connection)):
+                    return connection
+                self._discard(connection)
+        except BaseException:
+            self._free_slot()
+            raise
+
+    def release(self, connection, discard=False):
+        """Возвращает соединение в пул или закрывает его."""
+        try:
+            if discard:
+                self._discard(connection)
+            else:
+                with self._lock:
+                    self._idle.append(connection)
+        finally:
+            self._free_slot()
+
+    def _discard(self, connection):
+        with self._lock:
+            self._created.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _free_slot(self):
+        with self._lock:
+            self.in_use -= 1
+        self._slots.release()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias):
+    with _pools_lock:
+        if alias not in _pools:
+            _pools[alias] = ConnectionPool(
+                size=settings.DB_POOL_SIZE,
+                timeout=settings.DB_POOL_TIMEOUT,
+                max_age=settings.DB_POOL_MAX_AGE,
+            )
+        return _pools[alias]
+
+
+def pool_stats():
+    """{alias: статистика} по созданным пулам."""
+    with _pools_lock:
+        pools = dict(_pools)
+    return {alias: pool.stats() for alias, pool in pools.items()}
+
+
+class PooledDatabaseWrapperMixin:
+    """Берёт соединения из пула процесса и возвращает их при close().
+
+    Используется с CONN_MAX_AGE = 0: Django закрывает соединение после
+    каждого запроса, а пул держит его открытым для следующего.
+    """
+
+    def get_new_connection(self, conn_params):
+        return get_pool(self.alias).acquire(
+            lambda: super(
+                PooledDatabaseWrapperMixin, self
+            ).get_new_connection(conn_params),
+            self.ping,
+        )
+
+    def ping(self, connection):
+        if not self.settings_dict["CONN_HEALTH_CHECKS"]:
+            return True
+        try:
+            with closing(connection.cursor()) as cursor:
+                cursor.execute("SELECT 1")
+        except self.Database.Error:
+            return False
+        return True
+
+    def _close(self):
+        if self.connection is None:
+            return
+        discard = self.errors_occurred
+        if not discard:
+            # Следующий владелец получает соединение без открытой
+            # транзакции и в режиме autocommit из настроек.
+            try:
+                self.connection.rollback()
+                self._set_autocommit(self.settings_dict["AUTOCOMMIT"])
+            except self.Database.Error:
+                discard = True
+        get_pool(self.alias).release(self.connection, discard)
@@ -25,6 +25,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     # my
     'api',
     'recipes',
@@ -45,6 +46,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.InstrumentationMiddleware',
 ]
 
 ROOT_URLCONF = 'backend.urls'
@@ -67,14 +69,31 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'backend.wsgi.application'
 
+# DB_POOL=True включает пул соединений в процессе (по умолчанию под ASGI,
+# см. asgi.py), иначе соединения живут CONN_MAX_AGE секунд.
+DB_POOL = os.getenv('DB_POOL', 'False') == 'True'
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+DB_POOL_MAX_AGE = int(os.getenv('DB_POOL_MAX_AGE', 600))
+# Асинхронные представления списка и карточки рецепта, поиска
+# ингредиентов и тегов; включаются под ASGI.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        'ENGINE': (
+            'backend.db.postgresql' if DB_POOL
+            else 'django.db.backends.postgresql'
+        ),
         'NAME': os.getenv('POSTGRES_DB', 'postgres'),
         'USER': os.getenv('POSTGRES_USER', 'postgres'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'postgres'),
         'HOST': os.getenv('DB_HOST', '172.19.0.2'),
-        'DB_PORT': os.getenv('DB_PORT', '5432'),
+        'PORT': os.getenv('DB_PORT', '5432'),
+        'CONN_MAX_AGE': 0 if DB_POOL else int(os.getenv('CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': (
+            os.getenv('CONN_HEALTH_CHECKS', 'True') == 'True'
+        ),
     }
 }
 
@@ -110,6 +129,63 @@ MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+REFERENCE_CACHE_ALIAS = os.getenv('REFERENCE_CACHE_ALIAS') or None
+REFERENCE_CACHE_MAXSIZE = int(os.getenv('REFERENCE_CACHE_MAXSIZE', 20000))
+REFERENCE_CACHE_TIMEOUT = int(os.getenv('REFERENCE_CACHE_TIMEOUT', 300))
+# Сколько секунд клиент может не перепроверять теги и ингредиенты.
+CATALOGUE_MAX_AGE = int(os.getenv('CATALOGUE_MAX_AGE', 300))
+
+SUBSCRIPTIONS_CACHE_TIMEOUT = int(
+    os.getenv('SUBSCRIPTIONS_CACHE_TIMEOUT', 0))
+
+POPULARITY_HALF_LIFE_DAYS = float(os.getenv('POPULARITY_HALF_LIFE_DAYS', 7))
+POPULARITY_WEIGHTS = {
+    'favorites': 1.0,
+    'shopping_cart': 2.0,
+}
+
+# read — лента собирается запросом по подпискам,
+# write — рецепты раздаются по лентам подписчиков при публикации.
+TIMELINE_STRATEGY = os.getenv('TIMELINE_STRATEGY', 'read')
+TIMELINE_FANOUT_MAX_FOLLOWERS = int(
+    os.getenv('TIMELINE_FANOUT_MAX_FOLLOWERS', 10000))
+TIMELINE_BACKFILL = int(os.getenv('TIMELINE_BACKFILL', 100))
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv('INGREDIENT_SEARCH_LIMIT', 20))
+
+BULK_RECIPES_MAX = int(os.getenv('BULK_RECIPES_MAX', 100))
+
+METRICS_ALLOWED_IPS = os.getenv('METRICS_ALLOWED_IPS', '127.0.0.1').split(',')
+# Бюджеты SQL-запросов по эндпоинтам вида ViewSet.action.
+# В строгом режиме (тесты, CI) превышение — ошибка, иначе предупреждение.
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'False') == 'True'
+QUERY_BUDGET_DEFAULT = int(os.getenv('QUERY_BUDGET_DEFAULT', 20))
+QUERY_BUDGETS = {
+    'TagsViewSet.list': 3,
+    'TagsViewSet.retrieve': 3,
+    'IngredientsViewSet.list': 4,
+    'IngredientsViewSet.retrieve': 3,
+    'RecipeViewSet.list': 9,
+    'RecipeViewSet.retrieve': 9,
+    'RecipeViewSet.popular': 6,
+    'RecipeViewSet.timeline': 6,
+    'CustomUserViewSet.subscriptions': 5,
+}
+
+IMAGE_RENDITIONS = {
+    'thumbnail': (240, 240),
+    'card': (640, 640),
+}
+IMAGE_RENDITION_FORMAT = os.getenv('IMAGE_RENDITION_FORMAT', 'WEBP')
+IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', 80))
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', 2))
+IMAGE_SPOOL_SIZE = int(os.getenv('IMAGE_SPOOL_SIZE', 1024 * 1024))
+
+PDF_FONT_PATH = os.getenv(
+    'PDF_FONT_PATH', '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf')
+SHOPPING_LIST_SPOOL_SIZE = int(
+    os.getenv('SHOPPING_LIST_SPOOL_SIZE', 1024 * 1024))
+
 DJOSER = {
     'LOGIN_FIELD': 'email',
     'SERIALIZERS': {
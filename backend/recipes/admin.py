@@ -4,6 +4,10 @@ from django.utils.translation import gettext_lazy as _
 from .models import (Favorites, Ingredient, IngredientInRecipe, Recipe,
                      ShopCart, Tag, TagInRecipe)
 
+# Фильтры по внешним ключам выводят в боковую панель все связанные
+# объекты, поэтому для пользователей, рецептов и ингредиентов вместо
+# них используется поиск, а в формах — autocomplete.
+
 
 @register(Ingredient)
 class IngredientAdmin(ModelAdmin):
@@ -11,6 +15,7 @@ class IngredientAdmin(ModelAdmin):
 
     list_display = ("pk", "name", "measurement_unit",)
     search_fields = ("name",)
+    show_full_result_count = False
 
 
 @register(Tag)
@@ -18,44 +23,71 @@ class TagAdmin(ModelAdmin):
     """Настройка полей модели Tag в админке."""
 
     list_display = ("pk", "name", "color", "slug",)
+    search_fields = ("name", "slug")
 
 
 class RecipeIngredientsInline(TabularInline):
     model = IngredientInRecipe
+    autocomplete_fields = ("ingredient",)
     min_num = 1
     extra = 1
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            "ingredient", "recipe"
+        )
+
+
+class RecipeTagsInline(TabularInline):
+    model = TagInRecipe
+    autocomplete_fields = ("tag",)
+    min_num = 1
+    extra = 1
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("tag", "recipe")
+
 
 @register(Recipe)
 class RecipeAdmin(ModelAdmin):
     """Настройка полей модели Recipe в админке."""
 
     list_display = ("pk", "author", "name", "favorited",)
-    list_filter = ("author", "name", "tags")
-    search_fields = ("author", "name", "tags")
-    inlines = (RecipeIngredientsInline,)
+    list_filter = ("tags",)
+    list_select_related = ("author",)
+    search_fields = ("name", "author__username")
+    autocomplete_fields = ("author",)
+    inlines = (RecipeTagsInline, RecipeIngredientsInline)
     readonly_fields = ("favorited",)
+    show_full_result_count = False
 
     def favorited(self, obj):
-        return obj.favorited.all().count()
+        return obj.favorites_count
 
     favorited.short_description = _("Количество добавлений в избранное")
+    favorited.admin_order_field = "favorites_count"
 
 
 @register(ShopCart)
 class ShopCartAdmin(ModelAdmin):
     """Настройка полей модели ShopCart в админке."""
 
-    list_display = ("pk", "user", "recipe")
-    list_filter = ("user", "recipe")
+    list_display = ("pk", "user", "recipe", "added")
+    list_select_related = ("user", "recipe")
+    search_fields = ("user__username", "recipe__name")
+    autocomplete_fields = ("user", "recipe")
+    show_full_result_count = False
 
 
 @register(Favorites)
 class FavoriteAdmin(ModelAdmin):
     """Настройка полей модели Favorites в админке."""
 
-    list_display = ("pk", "user", "recipe")
-    list_filter = ("user", "recipe")
+    list_display = ("pk", "user", "recipe", "added")
+    list_select_related = ("user", "recipe")
+    search_fields = ("user__username", "recipe__name")
+    autocomplete_fields = ("user", "recipe")
+    show_full_result_count = False
 
 
 @register(IngredientInRecipe)
@@ -65,7 +97,10 @@ class IngredientInRecipeAdmin(ModelAdmin):
     Админ может редактировать ингридиенты в рецептах."""
 
     list_display = ("pk", "ingredient", "recipe", "amount",)
-    list_filter = ("ingredient", "recipe",)
+    list_select_related = ("ingredient", "recipe")
+    search_fields = ("ingredient__name", "recipe__name")
+    autocomplete_fields = ("ingredient", "recipe")
+    show_full_result_count = False
 
 
 @register(TagInRecipe)
@@ -75,3 +110,8 @@ class TagInRecipeAdmin(ModelAdmin):
     Админ может редактировать теги в рецептах."""
 
     list_display = ("pk", "tag", "recipe")
+    list_filter = ("tag",)
+    list_select_related = ("tag", "recipe")
+    search_fields = ("recipe__name",)
+    autocomplete_fields = ("recipe",)
+    show_full_result_count = False
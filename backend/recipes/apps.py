@@ -1,7 +1,15 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate, pre_migrate
 
 
 class RecipesConfig(AppConfig):
 
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'recipes'
+
+    def ready(self):
+        from .signals import (create_ingredient_search_indexes,
+                              merge_duplicate_ingredients)
+
+        pre_migrate.connect(merge_duplicate_ingredients, sender=self)
+        post_migrate.connect(create_ingredient_search_indexes, sender=self)
@@ -0,0 +1,48 @@
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно меняет счётчик одной строки на delta, не ниже нуля."""
+    queryset = model.objects.filter(pk=pk)
+    if delta < 0:
+        queryset = queryset.filter(**{f"{field}__gte": -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def change_counters(model, pks, field, delta):
+    """То же для многих строк одним запросом."""
+    queryset = model.objects.filter(pk__in=pks)
+    if delta < 0:
+        queryset = queryset.filter(**{f"{field}__gte": -delta})
+    queryset.update(**{field: F(field) + delta})
+
+
+def actual_count(related_model, related_field):
+    """Подзапрос: число связанных строк для OuterRef("pk")."""
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(
+                **{related_field: OuterRef("pk")}
+            ).order_by().values(related_field).annotate(
+                total=Count("pk")
+            ).values("total")
+        ),
+        Value(0),
+    )
+
+
+def reconcile_counter(model, field, related_model, related_field, fix=True):
+    """Находит строки, где счётчик разошёлся с данными, и исправляет их.
+
+    Возвращает число таких строк.
+    """
+    drifted = model.objects.annotate(
+        actual=actual_count(related_model, related_field)
+    ).filter(~Q(**{field: F("actual")}))
+    count = drifted.count()
+    if count and fix:
+        model.objects.filter(
+            pk__in=drifted.values("pk")
+        ).update(**{field: actual_count(related_model, related_field)})
+    return count
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 
 from users.models import UserFoodgram
 from .validators import (MinValueAmountIngridient,
@@ -24,6 +25,12 @@ class Ingredient(models.Model):
         verbose_name = "Ингридиент"
         verbose_name_plural = "Ингридиенты"
         ordering = ["-name", ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["name", "measurement_unit"],
+                name="unique_ingredient"
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.id}, {self.name}, {self.measurement_unit}"
@@ -80,6 +87,7 @@ class Recipe(models.Model):
     )
     tags = models.ManyToManyField(
         Tag,
+        through="TagInRecipe",
         related_name="recipes",
     )
     image = models.ImageField(
@@ -88,6 +96,12 @@ class Recipe(models.Model):
         upload_to="recipes/",
         blank=True
     )
+    image_renditions = models.JSONField(
+        verbose_name="уменьшенные копии изображения",
+        default=dict,
+        blank=True,
+        editable=False,
+    )
     text = models.TextField(
         verbose_name="текст рецепта",
         help_text="введите текст рецепта",
@@ -104,12 +118,26 @@ class Recipe(models.Model):
         auto_now_add=True,
         db_index=True,
     )
+    updated = models.DateTimeField(
+        verbose_name="Дата изменения рецепта",
+        auto_now=True,
+    )
     cooking_time = models.PositiveIntegerField(
         verbose_name="время приговления по рецепту в минутах",
         help_text="введите время приговления по рецепту в минутах",
         default=1,
         validators=[MinValueTimeCookingValidator(limit_value=1)],
     )
+    favorites_count = models.PositiveIntegerField(
+        verbose_name="добавлений в избранное",
+        default=0,
+        editable=False,
+    )
+    shopping_cart_count = models.PositiveIntegerField(
+        verbose_name="добавлений в список покупок",
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         """Метамодель для модели Recipe."""
@@ -117,6 +145,12 @@ class Recipe(models.Model):
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
         ordering = ["-created", ]
+        indexes = [
+            models.Index(
+                fields=["author", "-created"],
+                name="recipe_author_created_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         return self.name
@@ -138,6 +172,10 @@ class ShopCart(models.Model):
         related_name="shopping_cart",
         on_delete=models.CASCADE
     )
+    added = models.DateTimeField(
+        verbose_name="дата добавления",
+        default=timezone.now,
+    )
 
     class Meta:
         """Метамодель для модели ShopCart."""
@@ -156,6 +194,43 @@ class ShopCart(models.Model):
         return f"{self.user} {self.recipe}"
 
 
+class ShopCartIngredient(models.Model):
+    """Итоговое количество ингредиента в списке покупок пользователя.
+    Пересчитывается при изменении корзины и рецептов в ней."""
+
+    user = models.ForeignKey(
+        UserFoodgram,
+        verbose_name="покупатель",
+        related_name="shop_cart_ingredients",
+        on_delete=models.CASCADE,
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        verbose_name="ингредиент",
+        related_name="shop_cart_totals",
+        on_delete=models.CASCADE,
+    )
+    amount = models.IntegerField(
+        verbose_name="количество",
+        default=0,
+    )
+
+    class Meta:
+        """Метамодель для модели ShopCartIngredient."""
+
+        verbose_name = "ингредиент в списке покупок"
+        verbose_name_plural = "ингредиенты в списках покупок"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "ingredient"],
+                name="unique_shop_cart_ingredient"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user} {self.ingredient} {self.amount}"
+
+
 class Favorites(models.Model):
     """Модель списка избранных рецептов.
     Many-to-Many Recipe and UserFoodgram."""
@@ -172,6 +247,10 @@ class Favorites(models.Model):
         related_name="favorited",
         on_delete=models.CASCADE
     )
+    added = models.DateTimeField(
+        verbose_name="дата добавления",
+        default=timezone.now,
+    )
 
     class Meta:
         """Метамодель Favorites."""
@@ -188,6 +267,84 @@ class Favorites(models.Model):
         return f"{self.user} - {self.recipe}"
 
 
+class RecipePopularity(models.Model):
+    """Рейтинг популярности рецепта.
+
+    score — log2 суммы затухающих во времени весов добавлений
+    в избранное и в список покупок. dirty отмечает рецепты,
+    рейтинг которых нужно пересчитать.
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        verbose_name="рецепт",
+        related_name="popularity",
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    score = models.FloatField(
+        verbose_name="рейтинг",
+        default=0,
+    )
+    dirty = models.BooleanField(
+        verbose_name="требует пересчёта",
+        default=True,
+    )
+    updated = models.DateTimeField(
+        verbose_name="дата пересчёта",
+        auto_now=True,
+    )
+
+    class Meta:
+        """Метамодель для модели RecipePopularity."""
+
+        verbose_name = "популярность рецепта"
+        verbose_name_plural = "популярность рецептов"
+        indexes = [
+            models.Index(fields=["-score"], name="popularity_score_idx"),
+            models.Index(
+                fields=["recipe"],
+                condition=models.Q(dirty=True),
+                name="popularity_dirty_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.recipe_id} {self.score}"
+
+
+class TimelineEntry(models.Model):
+    """Рецепт в ленте подписчика при раздаче ленты при публикации."""
+
+    user = models.ForeignKey(
+        UserFoodgram,
+        verbose_name="подписчик",
+        related_name="timeline",
+        on_delete=models.CASCADE,
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name="рецепт",
+        related_name="timeline_entries",
+        on_delete=models.CASCADE,
+    )
+
+    class Meta:
+        """Метамодель для модели TimelineEntry."""
+
+        verbose_name = "запись ленты"
+        verbose_name_plural = "записи ленты"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "recipe"],
+                name="unique_timeline_entry"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.recipe_id}"
+
+
 class IngredientInRecipe(models.Model):
     """Модель колличества ингридиентов в рецептах.
         Many-to-Many Ingredient and Recipe."""
@@ -0,0 +1,108 @@
+import math
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Favorites, Recipe, RecipePopularity, ShopCart
+
+EPOCH = datetime(2023, 1, 1, tzinfo=timezone.utc)
+
+
+def mark_dirty(recipe_ids):
+    """Отмечает рецепты для пересчёта одним upsert-запросом."""
+    RecipePopularity.objects.bulk_create(
+        [RecipePopularity(recipe_id=pk, dirty=True) for pk in recipe_ids],
+        update_conflicts=True,
+        unique_fields=["recipe"],
+        update_fields=["dirty"],
+    )
+
+
+def exponent(added):
+    """Вес события в log2: каждые полураспада он растёт на 1.
+
+    Так старые рейтинги не нужно уменьшать со временем:
+    порядок рецептов тот же, что при затухании весов.
+    """
+    half_life = settings.POPULARITY_HALF_LIFE_DAYS * 24 * 60 * 60
+    return (added - EPOCH).total_seconds() / half_life
+
+
+def compute_scores(recipe_ids):
+    """{recipe_id: score} по добавлениям в избранное и корзину."""
+    weights = settings.POPULARITY_WEIGHTS
+    exponents = {}
+    for model, weight in ((Favorites, weights["favorites"]),
+                          (ShopCart, weights["shopping_cart"])):
+        for recipe_id, added in model.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list("recipe_id", "added"):
+            exponents.setdefault(recipe_id, []).append(
+                exponent(added) + math.log2(weight)
+            )
+    scores = {}
+    for recipe_id, values in exponents.items():
+        top = max(values)
+        scores[recipe_id] = top + math.log2(
+            sum(2 ** (value - top) for value in values)
+        )
+    return scores
+
+
+def refresh_batch(batch_size):
+    """Пересчитывает до batch_size отмеченных рецептов.
+
+    Флаг снимается до чтения событий: если рецепт изменится во
+    время пересчёта, он будет отмечен снова и попадёт в следующий.
+    """
+    with transaction.atomic():
+        recipe_ids = list(RecipePopularity.objects.filter(
+            dirty=True
+        ).values_list("recipe_id", flat=True)[:batch_size])
+        if not recipe_ids:
+            return 0
+        RecipePopularity.objects.filter(
+            recipe_id__in=recipe_ids
+        ).update(dirty=False)
+    scores = compute_scores(recipe_ids)
+    RecipePopularity.objects.filter(
+        recipe_id__in=set(recipe_ids) - scores.keys(), dirty=False
+    ).delete()
+    rows = list(RecipePopularity.objects.filter(recipe_id__in=scores))
+    for row in rows:
+        row.score = scores[row.recipe_id]
+    RecipePopularity.objects.bulk_update(rows, ["score"])
+    return len(recipe_ids)
+
+
+def refresh(batch_size=1000, full=False):
+    """Пересчитывает рейтинги, возвращает число рецептов."""
+    if full:
+        RecipePopularity.objects.update(dirty=True)
+        for model in (Favorites, ShopCart):
+            recipe_ids = model.objects.filter(
+                recipe__popularity__isnull=True
+            ).values_list("recipe_id", flat=True).distinct()
+            batch = []
+            for recipe_id in recipe_ids.iterator():
+                batch.append(recipe_id)
+                if len(batch) >= batch_size:
+                    mark_dirty(batch)
+                    batch = []
+            mark_dirty(batch)
+    total = 0
+    while True:
+        refreshed = refresh_batch(batch_size)
+        if not refreshed:
+            return total
+        total += refreshed
+
+
+def popular_recipes(queryset=None):
+    """Рецепты в порядке убывания рейтинга."""
+    if queryset is None:
+        queryset = Recipe.objects.all()
+    return queryset.filter(popularity__isnull=False).order_by(
+        "-popularity__score", "-id"
+    )
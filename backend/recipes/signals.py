@@ -0,0 +1,156 @@
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from users.models import Fallow, UserFoodgram
+from . import timeline
+from .counters import change_counter
+from .models import (Favorites, Ingredient, IngredientInRecipe, Recipe,
+                     ShopCart, ShopCartIngredient)
+from .popularity import mark_dirty
+
+
+def create_ingredient_search_indexes(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Триграммные индексы для поиска ингредиентов в PostgreSQL.
+
+    Создаются после migrate, так как требуют расширения pg_trgm.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return
+    table = Ingredient._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_name_trgm "
+            f"ON {table} USING gin (name gin_trgm_ops)"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS {table}_name_upper_trgm "
+            f"ON {table} USING gin ((UPPER(name::text)) gin_trgm_ops)"
+        )
+
+
+def merge_duplicate_ingredients(using=DEFAULT_DB_ALIAS, **kwargs):
+    """Сливает ингредиенты с одинаковыми названием и единицей измерения.
+
+    Выполняется перед migrate, чтобы ограничение unique_ingredient
+    создалось на базе, заполненной до него. Остаётся ингредиент
+    с меньшим id: строки рецептов и итогов корзин переносятся на него,
+    а если у рецепта или пользователя он уже есть, количества
+    складываются.
+    """
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    table = quote(Ingredient._meta.db_table)
+    with connection.cursor() as cursor:
+        existing = connection.introspection.table_names(cursor)
+        if Ingredient._meta.db_table not in existing:
+            return
+        cursor.execute(
+            f"SELECT duplicate.id, kept.id FROM {table} duplicate "
+            f"JOIN (SELECT name, measurement_unit, MIN(id) AS id "
+            f"FROM {table} GROUP BY name, measurement_unit "
+            f"HAVING COUNT(*) > 1) kept "
+            f"ON duplicate.name = kept.name "
+            f"AND duplicate.measurement_unit = kept.measurement_unit "
+            f"WHERE duplicate.id <> kept.id"
+        )
+        duplicates = cursor.fetchall()
+    if not duplicates:
+        return
+    related = [
+        (quote(model._meta.db_table), quote(owner))
+        for model, owner in ((IngredientInRecipe, "recipe_id"),
+                             (ShopCartIngredient, "user_id"))
+        if model._meta.db_table in existing
+    ]
+    with transaction.atomic(using), connection.cursor() as cursor:
+        for rows, owner in related:
+            same_owner = (
+                f"{owner} IN (SELECT {owner} FROM {rows} "
+                f"WHERE ingredient_id = %s)"
+            )
+            for duplicate, kept in duplicates:
+                cursor.execute(
+                    f"UPDATE {rows} SET amount = amount + ("
+                    f"SELECT other.amount FROM {rows} other "
+                    f"WHERE other.{owner} = {rows}.{owner} "
+                    f"AND other.ingredient_id = %s) "
+                    f"WHERE ingredient_id = %s AND {same_owner}",
+                    [duplicate, kept, duplicate],
+                )
+                cursor.execute(
+                    f"DELETE FROM {rows} "
+                    f"WHERE ingredient_id = %s AND {same_owner}",
+                    [duplicate, kept],
+                )
+                cursor.execute(
+                    f"UPDATE {rows} SET ingredient_id = %s "
+                    f"WHERE ingredient_id = %s",
+                    [kept, duplicate],
+                )
+        cursor.execute(
+            f"DELETE FROM {table} WHERE id IN "
+            f"({', '.join(['%s'] * len(duplicates))})",
+            [duplicate for duplicate, _ in duplicates],
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(instance, created, **kwargs):
+    if created:
+        change_counter(UserFoodgram, instance.author_id, "recipes_count", 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(instance, **kwargs):
+    change_counter(UserFoodgram, instance.author_id, "recipes_count", -1)
+
+
+@receiver(post_save, sender=Favorites)
+def increment_favorites_count(instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, "favorites_count", 1)
+
+
+@receiver(post_delete, sender=Favorites)
+def decrement_favorites_count(instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, "favorites_count", -1)
+
+
+@receiver(post_save, sender=ShopCart)
+def increment_shopping_cart_count(instance, created, **kwargs):
+    if created:
+        change_counter(Recipe, instance.recipe_id, "shopping_cart_count", 1)
+
+
+@receiver(post_delete, sender=ShopCart)
+def decrement_shopping_cart_count(instance, **kwargs):
+    change_counter(Recipe, instance.recipe_id, "shopping_cart_count", -1)
+
+
+@receiver((post_save, post_delete), sender=Favorites)
+@receiver((post_save, post_delete), sender=ShopCart)
+def mark_popularity_dirty(sender, instance, origin=None, **kwargs):
+    # При каскадном удалении рецепта или пользователя строка рейтинга
+    # могла бы ссылаться на удаляемый рецепт, такие случаи
+    # исправляет refresh_popularity --full.
+    if origin is not None and not (
+        isinstance(origin, sender) or getattr(origin, "model", None) is sender
+    ):
+        return
+    mark_dirty([instance.recipe_id])
+
+
+@receiver(post_save, sender=Fallow)
+def fill_timeline(instance, created, **kwargs):
+    if created:
+        timeline.follow(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Fallow)
+def clear_timeline(instance, origin=None, **kwargs):
+    if isinstance(origin, UserFoodgram):
+        return
+    timeline.unfollow(instance.user_id, instance.author_id)
@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.db.models import Q
+
+from users.models import Fallow, UserFoodgram
+from .models import Recipe, TimelineEntry
+
+BATCH_SIZE = 1000
+
+
+def fan_out_on_write():
+    return settings.TIMELINE_STRATEGY == "write"
+
+
+def is_fanned_out(author_id):
+    """Раздаются ли рецепты автора по лентам подписчиков.
+
+    Рецепты авторов с числом подписчиков больше
+    TIMELINE_FANOUT_MAX_FOLLOWERS подмешиваются при чтении.
+    """
+    followers = UserFoodgram.objects.filter(
+        pk=author_id
+    ).values_list("followers_count", flat=True).first()
+    return (followers or 0) <= settings.TIMELINE_FANOUT_MAX_FOLLOWERS
+
+
+def add_entries(pairs):
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, recipe_id=recipe_id)
+         for user_id, recipe_id in pairs),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+
+def fan_out(recipe):
+    """Добавляет новый рецепт в ленты подписчиков автора."""
+    if not fan_out_on_write() or not is_fanned_out(recipe.author_id):
+        return
+    followers = Fallow.objects.filter(
+        author_id=recipe.author_id
+    ).values_list("user_id", flat=True)
+    add_entries(
+        (user_id, recipe.id) for user_id in followers.iterator()
+    )
+
+
+def follow(user_id, author_id):
+    """Заполняет ленту последними рецептами нового автора."""
+    if not fan_out_on_write() or not is_fanned_out(author_id):
+        return
+    recipes = Recipe.objects.filter(
+        author_id=author_id
+    ).order_by("-created").values_list(
+        "id", flat=True
+    )[:settings.TIMELINE_BACKFILL]
+    add_entries((user_id, recipe_id) for recipe_id in recipes)
+
+
+def unfollow(user_id, author_id):
+    TimelineEntry.objects.filter(
+        user_id=user_id, recipe__author_id=author_id
+    ).delete()
+
+
+def timeline_filter(user):
+    """Условие на рецепты ленты пользователя для текущей стратегии."""
+    followed = Fallow.objects.filter(user=user).values("author")
+    if not fan_out_on_write():
+        return Q(author__in=followed)
+    return Q(
+        pk__in=TimelineEntry.objects.filter(user=user).values("recipe")
+    ) | Q(author__in=UserFoodgram.objects.filter(
+        follow__user=user,
+        followers_count__gt=settings.TIMELINE_FANOUT_MAX_FOLLOWERS,
+    ).values("pk"))
@@ -1,4 +1,13 @@
 #!/bin/sh
 python3 manage.py makemigrations
 python3 manage.py migrate
-gunicorn --bind 0:8000 backend.wsgi
\ No newline at end of file
+python3 manage.py merge_recipe_tags
+python3 manage.py recount_counters
+python3 manage.py cart_totals
+# SERVER_MODE=asgi запускает uvicorn с асинхронными представлениями,
+# WEB_CONCURRENCY задаёт число воркеров в обоих режимах.
+if [ "$SERVER_MODE" = "asgi" ]; then
+    exec uvicorn backend.asgi:application --host 0.0.0.0 --port 8000 \
+        --limit-concurrency "${ASGI_LIMIT_CONCURRENCY:-1000}"
+fi
+exec gunicorn --bind 0:8000 backend.wsgi
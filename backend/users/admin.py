@@ -10,12 +10,15 @@ admin.site.unregister(Group)  # Убираем видимость админки
 @register(UserFoodgram)
 class MyUserAdmin(UserAdmin):
     list_display = ('pk', 'username', 'email', 'first_name', 'last_name')
-    list_filter = ('username', 'email')
+    list_filter = ('is_staff', 'is_active')
     search_fields = ('username', 'email')
+    show_full_result_count = False
 
 
 @register(Fallow)
 class FollowAdmin(ModelAdmin):
     list_display = ('pk', 'user', 'author')
-    search_fields = ('user', 'author')
-    list_filter = ('user', 'author')
+    list_select_related = ('user', 'author')
+    search_fields = ('user__username', 'author__username')
+    autocomplete_fields = ('user', 'author')
+    show_full_result_count = False
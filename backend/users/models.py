@@ -39,6 +39,16 @@ class UserFoodgram(AbstractUser):
         max_length=150,
         help_text="Максимум 128 символов",
     )
+    recipes_count = models.PositiveIntegerField(
+        verbose_name="рецептов",
+        default=0,
+        editable=False,
+    )
+    followers_count = models.PositiveIntegerField(
+        verbose_name="подписчиков",
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         """Метамодель для модели UserFoodgram."""
@@ -84,6 +94,12 @@ class Fallow(models.Model):
                 violation_error_message="ошибка подписки",
             )
         ]
+        indexes = [
+            models.Index(
+                fields=["user", "date_added"],
+                name="follow_user_date_added_idx",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.user.username} -> {self.author.username}"
@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.counters import change_counter
+from .models import Fallow, UserFoodgram
+
+
+@receiver(post_save, sender=Fallow)
+def increment_followers_count(instance, created, **kwargs):
+    if created:
+        change_counter(UserFoodgram, instance.author_id, "followers_count", 1)
+
+
+@receiver(post_delete, sender=Fallow)
+def decrement_followers_count(instance, **kwargs):
+    change_counter(UserFoodgram, instance.author_id, "followers_count", -1)